@@ -4,3 +4,4 @@ from mwcleric.fandom_client import FandomClient
 from mwcleric.auth_credentials import AuthCredentials
 from mwcleric.template_modifier import TemplateModifierBase
 from mwcleric.page_modifier import PageModifierBase
+from mwcleric.multi_template_modifier import MultiTemplateModifier
@@ -0,0 +1,128 @@
+import json
+import os
+from datetime import datetime
+from typing import Optional, List, Union, Dict
+
+
+class ChangeFeed(object):
+    """
+    Keeps track of which recent changes and log events have already been seen, so that scripts run on a schedule
+    get every change exactly once even if runs overlap, are late, or are skipped. Get one from WikiClient.change_feed.
+
+    The position in the feed is saved to a state file, but only when commit() is called. Call it after the changes
+    returned by poll() have been handled, so that if the script fails, the same changes are returned next time.
+
+    Example::
+
+        feed = site.change_feed('my_bot_state.json')
+        for titles in feed.poll():
+            for page in site.get_pages_with_text(titles):
+                ...
+        feed.commit()
+    """
+
+    def __init__(self, site, state_file: str, namespace: Optional[Union[int, str]] = None,
+                 rc_type: str = 'edit|new', logs: bool = True, since: Optional[datetime] = None):
+        """
+        :param site: a WikiClient
+        :param state_file: Where to save the position in the feed
+        :param namespace: Optional - only return changes in this namespace
+        :param rc_type: Which types of recent changes to return, passed directly to the api as rctype
+        :param logs: Also return the pages affected by log events (moves, deletions, uploads, etc)?
+        :param since: Where to start if there's no state file yet, as a naive UTC datetime.
+            Defaults to the time of the first poll, i.e. only changes made after that are returned.
+        """
+        self.site = site
+        self.state_file = state_file
+        if isinstance(namespace, str):
+            namespace = site.get_ns_number(namespace)
+        self.namespace = namespace
+        self.rc_type = rc_type
+        self.logs = logs
+        self.since = since
+        self.state = self._load_state()
+        self._pending_state: Optional[Dict[str, dict]] = None
+
+    def _load_state(self) -> Dict[str, dict]:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def poll(self) -> List[List[str]]:
+        """
+        Returns the titles of every page that has changed since the saved position, without duplicates,
+        split into batches that can each be fetched in a single request (e.g. with WikiClient.get_pages_with_text).
+        The position isn't saved until commit() is called.
+        """
+        start = (self.since or datetime.utcnow()).strftime('%Y-%m-%dT%H:%M:%SZ')
+        state = {
+            'rc': dict(self.state.get('rc', {'timestamp': start, 'id': 0})),
+            'log': dict(self.state.get('log', {'timestamp': start, 'id': 0})),
+        }
+        titles = list(self._recent_titles(state['rc']))
+        if self.logs:
+            titles += self._log_titles(state['log'])
+        self._pending_state = state
+        return list(self.site.paginate(list(dict.fromkeys(titles))))
+
+    def commit(self):
+        """Saves the position reached by the last poll, so the next poll only returns changes made after it"""
+        if self._pending_state is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.state_file))
+        os.makedirs(directory, exist_ok=True)
+        tmp_file = '{}.{}.tmp'.format(self.state_file, os.getpid())
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._pending_state, f)
+        os.replace(tmp_file, self.state_file)
+        self.state = self._pending_state
+        self._pending_state = None
+
+    def _recent_titles(self, cursor: dict):
+        data = dict(list='recentchanges', rcdir='newer', rcstart=cursor['timestamp'], rctype=self.rc_type,
+                    rcprop='title|ids|timestamp', rclimit='max')
+        if self.namespace is not None:
+            data['rcnamespace'] = self.namespace
+        for change in self._query_all(data, 'recentchanges'):
+            if not self._advance(cursor, change['timestamp'], change['rcid']):
+                continue
+            yield change['title']
+
+    def _log_titles(self, cursor: dict):
+        data = dict(list='logevents', ledir='newer', lestart=cursor['timestamp'],
+                    leprop='title|ids|timestamp|type|details', lelimit='max')
+        if self.namespace is not None:
+            data['lenamespace'] = self.namespace
+        for log in self._query_all(data, 'logevents'):
+            if not self._advance(cursor, log['timestamp'], log['logid']):
+                continue
+            if 'title' in log:
+                yield log['title']
+            # for moves, the page is now at the target title
+            target = log.get('params', {}).get('target_title')
+            if target is not None:
+                yield target
+
+    @staticmethod
+    def _advance(cursor: dict, timestamp: str, entry_id: int) -> bool:
+        """
+        Moves the cursor forward to an entry, or returns False if we've already seen it. The start of the query is
+        inclusive, so we get back the last entry we saw and anything else with its timestamp. Ids aren't in order of
+        timestamp (e.g. imported or backdated entries), so entries are compared by timestamp first and then by id,
+        and the cursor never moves backwards.
+        """
+        if (timestamp, entry_id) <= (cursor['timestamp'], cursor['id']):
+            return False
+        cursor['timestamp'] = timestamp
+        cursor['id'] = entry_id
+        return True
+
+    def _query_all(self, data: dict, key: str):
+        while True:
+            result = self.site.client.api('query', **data)
+            yield from result['query'][key]
+            if 'continue' not in result:
+                return
+            data.update(result['continue'])
@@ -1,4 +1,11 @@
-from typing import Union, List, Optional
+import functools
+import heapq
+import re
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Union, List, Optional, Iterator, Iterable
+
+from mwclient.errors import APIError
 
 from mwcleric.clients.site import Site
 
@@ -8,6 +15,10 @@ class CargoClient(object):
     Extends mwclient.Site with basic Cargo operations.
     """
     client = None
+    # the name that the key is fetched as when using keyset continuation
+    keyset_alias = 'mwcleric_keyset_key'
+    # values that are compared as numbers when merging sorted shards
+    number_pattern = re.compile(r'^-?\d+(\.\d+)?$')
 
     def __init__(self, client: Site, **kwargs):
         self.client = client
@@ -16,12 +27,47 @@ class CargoClient(object):
               where: Optional[str] = None, join_on: Optional[Union[str, List[str]]] = None,
               group_by: Optional[str] = None, having: Optional[Union[str, List[str]]] = None,
               order_by: Optional[str] = None, offset: Optional[int] = None, limit: Optional[int] = None,
-              auto_continue: bool = True):
+              auto_continue: bool = True, keyset: Union[bool, str] = False) -> List[dict]:
+        """
+        Runs a Cargo query, by default continuing until every row has been fetched
+
+        :param keyset: Continue each request from the key of the last row we got, instead of using an offset.
+            Pass True to use the _ID of the first table, or the name of any other field whose values are unique
+            and never empty. The rows are ordered by the key, so order_by can't be used, and neither can offset.
+            This is much faster for large tables, since the database doesn't have to count its way past all of the
+            rows we already have for each request, and rows can't be skipped or repeated if the table changes
+            in the meantime.
+        """
+        return list(self.query_iter(tables=tables, fields=fields, where=where, join_on=join_on, group_by=group_by,
+                                    having=having, order_by=order_by, offset=offset, limit=limit,
+                                    auto_continue=auto_continue, keyset=keyset))
+
+    def query_iter(self, *, tables: Union[str, List[str]], fields: Union[str, List[str]],
+                   where: Optional[str] = None, join_on: Optional[Union[str, List[str]]] = None,
+                   group_by: Optional[str] = None, having: Optional[Union[str, List[str]]] = None,
+                   order_by: Optional[str] = None, offset: Optional[int] = None, limit: Optional[int] = None,
+                   auto_continue: bool = True, keyset: Union[bool, str] = False,
+                   batches: bool = False) -> Iterator[Union[dict, List[dict]]]:
+        """
+        Same as query, but yields the rows as each response comes in, so only one response's worth of rows is ever
+        held in memory (unless the caller keeps them).
+
+        :param batches: Yield a list of rows for each response, instead of one row at a time
+        :return: A generator of rows, or of lists of rows
+        """
         # auto-continue & set limit to max unless the user specified a lower limit, or set auto-continue to False
         if limit is not None:
             auto_continue = False
         if auto_continue:
             limit = 'max'
+        key = None
+        if keyset:
+            if order_by is not None or offset is not None:
+                raise ValueError('order_by and offset cannot be used with keyset, rows are ordered by the key')
+            key = self._keyset_field(tables) if keyset is True else keyset
+            # cargo doesn't allow aliases that start with an underscore, e.g. _ID
+            fields = (fields if isinstance(fields, list) else [fields]) + ['{}={}'.format(key, self.keyset_alias)]
+            order_by = key
         data = {}
         fields_to_concat = {
             'tables': tables,
@@ -44,15 +90,139 @@ class CargoClient(object):
         for field_name, field in fields_to_add.items():
             if field is not None:
                 data[field_name] = field
-        ret = []
+        responses = self._query_responses(data, auto_continue, key, quote_key=keyset is not True)
+        if batches:
+            return responses
+        return (row for rows in responses for row in rows)
+
+    @staticmethod
+    def _keyset_field(tables: Union[str, List[str]]) -> str:
+        """The _ID field of the first table, including its alias if it has one"""
+        table = tables[0] if isinstance(tables, list) else tables.split(',')[0]
+        return '{}._ID'.format(table.split('=')[-1].strip())
+
+    def _query_responses(self, data: dict, auto_continue: bool, key: Optional[str] = None,
+                         quote_key: bool = True) -> Iterator[List[dict]]:
+        """Makes the query, continuing from where each response ended, and yields the rows of each response"""
+        offset = data.get('offset') or 0
+        where = data.get('where')
         while True:
             response = self.client.api('cargoquery', **data)
-            for item in response['cargoquery']:
-                ret.append(item['title'])
-            if not auto_continue or response['limits']['cargoquery'] > len(response['cargoquery']):
-                break
-            data['offset'] = len(ret)
-        return ret
+            rows = [item['title'] for item in response['cargoquery']]
+            last_key = None
+            if key is not None:
+                for row in rows:
+                    last_key = row.pop(self.keyset_alias, None)
+            yield rows
+            if not auto_continue or response['limits']['cargoquery'] > len(rows):
+                return
+            if key is None:
+                offset += len(rows)
+                data['offset'] = offset
+                continue
+            if last_key is None:
+                raise ValueError('The keyset field {} must never be empty'.format(key))
+            condition = '{} > {}'.format(key, self._quote(last_key) if quote_key else int(last_key))
+            data['where'] = '({}) AND {}'.format(where, condition) if where else condition
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+
+    def query_sharded(self, *, tables: Union[str, List[str]], fields: Union[str, List[str]],
+                      where: Optional[str] = None, join_on: Optional[Union[str, List[str]]] = None,
+                      group_by: Optional[str] = None, having: Optional[Union[str, List[str]]] = None,
+                      order_by: Optional[str] = None, shards: int = 8, concurrency: int = 4,
+                      partition_field: Optional[str] = None,
+                      partition_values: Optional[Iterable] = None) -> List[dict]:
+        """
+        Runs a large query as several smaller queries at the same time, which is much faster when most of the time
+        is spent waiting for responses. By default the rows are split into ranges of the first table's _ID, found
+        by first asking for its smallest and largest _ID; alternatively give a field and the values to split by.
+
+        Each shard is continued with keyset continuation unless group_by or order_by is given.
+
+        :param shards: How many ranges of _ID to split the query into, when not using partition_field
+        :param concurrency: How many queries to run at once
+        :param partition_field: Optional - split the query by the value of this field instead
+        :param partition_values: The values of partition_field to query, each one is a shard. Rows with any other
+            value of the field aren't returned.
+        :param order_by: As in query. The database sorts each shard, and then their rows are merged in about the
+            same order, which requires every field in it to be included in fields under the same name.
+        :return: A list of rows
+        """
+        if partition_field is not None:
+            if partition_values is None:
+                raise ValueError('partition_values must be given with partition_field')
+            conditions = ['{} = {}'.format(partition_field, self._quote(str(value))) for value in partition_values]
+        elif group_by is not None:
+            # a group could be split between ranges of _ID
+            raise ValueError('group_by can only be used with partition_field')
+        else:
+            conditions = self._id_ranges(tables, where, join_on, shards)
+        keyset = order_by is None and group_by is None
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            futures = [executor.submit(self.query, tables=tables, fields=fields,
+                                       where='({}) AND {}'.format(where, condition) if where else condition,
+                                       join_on=join_on, group_by=group_by, having=having, order_by=order_by,
+                                       keyset=keyset)
+                       for condition in conditions]
+            results = [future.result() for future in futures]
+        if order_by is not None and len(results) > 1:
+            return self._merge_shards(results, order_by)
+        return [row for result in results for row in result]
+
+    def _id_ranges(self, tables: Union[str, List[str]], where: Optional[str],
+                   join_on: Optional[Union[str, List[str]]], shards: int) -> List[str]:
+        """Conditions that split the rows into shards ranges of _ID of about the same size"""
+        key = self._keyset_field(tables)
+        bounds = self.query(tables=tables, where=where, join_on=join_on,
+                            fields='MIN({0})=mwcleric_min, MAX({0})=mwcleric_max'.format(key))
+        if len(bounds) == 0 or bounds[0].get('mwcleric_min') is None:
+            return []
+        low, high = int(bounds[0]['mwcleric_min']), int(bounds[0]['mwcleric_max'])
+        size = -(-(high - low + 1) // max(shards, 1))
+        return ['{0} >= {1} AND {0} < {2}'.format(key, start, min(start + size, high + 1))
+                for start in range(low, high + 1, size)]
+
+    @classmethod
+    def _merge_shards(cls, shards: List[List[dict]], order_by: str) -> List[dict]:
+        """
+        Merges the rows of shards that were each sorted by the database into one list in order of order_by.
+        The database's collation isn't known here, so the order of values that it would compare differently than
+        we do (e.g. accented letters) is only approximate; rows within each shard always stay in the database's order.
+        """
+        rows = [row for shard in shards for row in shard]
+        columns = []
+        for clause in [clause.split() for clause in order_by.split(',')]:
+            name = clause[0].split('.')[-1]
+            if any(name not in row for row in rows):
+                raise ValueError('To be sorted by {}, it must be one of the fields'.format(name))
+            descending = len(clause) > 1 and clause[1].upper() == 'DESC'
+            # only compare as numbers if the whole column looks like numbers, since the api returns everything as
+            # strings and e.g. "inf" or "1e3" in a String field must still be compared as text
+            numeric = all(row[name] is None or cls.number_pattern.match(str(row[name])) for row in rows)
+            columns.append((name, descending, numeric))
+
+        def compare(row1: dict, row2: dict) -> int:
+            for name, descending, numeric in columns:
+                value1, value2 = (cls._collation_key(row[name], numeric) for row in (row1, row2))
+                if value1 != value2:
+                    # nulls sort first, like in MySQL
+                    result = -1 if value1 is None else 1 if value2 is None else -1 if value1 < value2 else 1
+                    return -result if descending else result
+            return 0
+
+        return list(heapq.merge(*shards, key=functools.cmp_to_key(compare)))
+
+    @staticmethod
+    def _collation_key(value, numeric: bool):
+        if value is None:
+            return None
+        if numeric:
+            return Decimal(str(value))
+        # strings case-insensitively like the database's default collation
+        return str(value).casefold()
 
     def query_one_result(self, fields, **kwargs):
         rows = self.query(fields=fields, **kwargs)
@@ -89,9 +259,17 @@ class CargoClient(object):
     def recreate(self, templates, replacement=True):
         if isinstance(templates, str):
             templates = [templates]
-        token = self.client.get_token('csrf')
         for template in templates:
             if not replacement:
-                self.client.api('cargorecreatetables', template=template, token=token)
+                self._api_with_token('cargorecreatetables', template=template)
                 continue
-            self.client.api('cargorecreatetables', template=template, createReplacement=1, token=token)
+            self._api_with_token('cargorecreatetables', template=template, createReplacement=1)
+
+    def _api_with_token(self, action: str, **data):
+        # mwclient caches the token on the site, so it's only requested once for all of the templates
+        try:
+            return self.client.api(action, token=self.client.get_token('csrf'), **data)
+        except APIError as e:
+            if e.code != 'badtoken':
+                raise e
+        return self.client.api(action, token=self.client.get_token('csrf', force=True), **data)
@@ -0,0 +1,136 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+class ApiEvent(object):
+    """
+    A single api call made through a Site, including any retries that mwclient made for it
+
+    * action - the api action, e.g. query
+    * params - the modules used, e.g. {'prop': 'revisions'}
+    * titles - how many titles were sent
+    * latency - seconds from the first request being sent until the response was parsed, including waits
+    * wait - the part of latency that wasn't spent on requests, i.e. sleeping before mwclient retried
+    * bytes - total size of the responses
+    * retries - how many times mwclient had to send the request again
+    * error - the api's error code, or the name of the exception if there was no api response
+    """
+    __slots__ = ('action', 'params', 'titles', 'latency', 'wait', 'bytes', 'retries', 'error')
+
+    def __init__(self, action: str, params: Dict[str, str], titles: int, latency: float, wait: float,
+                 response_bytes: int, retries: int, error: Optional[str]):
+        self.action = action
+        self.params = params
+        self.titles = titles
+        self.latency = latency
+        self.wait = wait
+        self.bytes = response_bytes
+        self.retries = retries
+        self.error = error
+
+    @property
+    def key(self) -> str:
+        """The action and modules, e.g. 'query prop=revisions', which is what stats are grouped by"""
+        return ' '.join([self.action] + ['{}={}'.format(k, v) for k, v in sorted(self.params.items())])
+
+
+class _Stats(object):
+    __slots__ = ('calls', 'errors', 'retries', 'titles', 'bytes', 'latency', 'wait', 'max_latency', 'buckets')
+
+    def __init__(self, bucket_count: int):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.titles = 0
+        self.bytes = 0
+        self.latency = 0.0
+        self.wait = 0.0
+        self.max_latency = 0.0
+        self.buckets = [0] * bucket_count
+
+
+class Instrumentation(object):
+    """
+    Collects an ApiEvent for every api call made through any Site it's attached to (WikiClient attaches it to its
+    site, which is also what CargoClient uses), and passes each one to the registered callbacks.
+    It also keeps counts and a latency histogram per action, plus counts of retries made by WikiClient,
+    which can be printed with report() or exported with summary().
+    """
+    # upper bounds in seconds of the latency histogram's buckets, the last bucket is everything slower
+    latency_buckets = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+    def __init__(self):
+        self.callbacks: List[Callable[[ApiEvent], None]] = []
+        self._stats: Dict[str, _Stats] = {}
+        self._retries: Dict[str, int] = {}
+        self._retry_wait = 0.0
+        self._lock = threading.Lock()
+
+    def add_callback(self, callback: Callable[[ApiEvent], None]):
+        """Calls callback with each ApiEvent, from whichever thread made the call"""
+        self.callbacks.append(callback)
+
+    def emit(self, event: ApiEvent):
+        with self._lock:
+            stats = self._stats.get(event.key)
+            if stats is None:
+                stats = _Stats(len(self.latency_buckets) + 1)
+                self._stats[event.key] = stats
+            stats.calls += 1
+            stats.errors += 1 if event.error is not None else 0
+            stats.retries += event.retries
+            stats.titles += event.titles
+            stats.bytes += event.bytes
+            stats.latency += event.latency
+            stats.wait += event.wait
+            stats.max_latency = max(stats.max_latency, event.latency)
+            stats.buckets[bisect.bisect_left(self.latency_buckets, event.latency)] += 1
+        for callback in self.callbacks:
+            callback(event)
+
+    def record_retry(self, failure_type: str, error_class: str, wait: float):
+        """Counts a retry of a whole action by WikiClient, e.g. after relogging"""
+        with self._lock:
+            key = '{} ({})'.format(failure_type, error_class)
+            self._retries[key] = self._retries.get(key, 0) + 1
+            self._retry_wait += wait
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._retries = {}
+            self._retry_wait = 0.0
+
+    def summary(self) -> dict:
+        """All of the stats as a dict, e.g. to save as json"""
+        with self._lock:
+            calls = {}
+            for key, stats in self._stats.items():
+                calls[key] = {
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'retries': stats.retries,
+                    'titles': stats.titles,
+                    'bytes': stats.bytes,
+                    'latency': stats.latency,
+                    'wait': stats.wait,
+                    'max_latency': stats.max_latency,
+                    'latency_histogram': dict(zip([str(b) for b in self.latency_buckets] + ['inf'], stats.buckets)),
+                }
+            return {'calls': calls, 'retries': dict(self._retries), 'retry_wait': self._retry_wait}
+
+    def report(self) -> str:
+        """A human-readable table of the stats"""
+        summary = self.summary()
+        lines = ['{:<50} {:>7} {:>6} {:>7} {:>10} {:>9} {:>9} {:>9}'.format(
+            'api call', 'calls', 'errors', 'retries', 'kB', 'seconds', 'avg ms', 'max ms')]
+        for key, stats in sorted(summary['calls'].items(), key=lambda item: -item[1]['latency']):
+            lines.append('{:<50} {:>7} {:>6} {:>7} {:>10.1f} {:>9.2f} {:>9.1f} {:>9.1f}'.format(
+                key[:50], stats['calls'], stats['errors'], stats['retries'], stats['bytes'] / 1024,
+                stats['latency'], 1000 * stats['latency'] / stats['calls'], 1000 * stats['max_latency']))
+        for key, count in sorted(summary['retries'].items()):
+            lines.append('retried {}: {} times'.format(key, count))
+        if summary['retries']:
+            lines.append('waited {:.1f} seconds before retries'.format(summary['retry_wait']))
+        return '\n'.join(lines)
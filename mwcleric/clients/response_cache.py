@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Iterable, Set
+
+from mwcleric.auth_credentials import AuthCredentials
+
+
+class ResponseCache(object):
+    """
+    Saves the responses of read-only api calls (query, cargoquery and parse) to disk, so that running the same script
+    again (e.g. a dry run of a TemplateModifier while developing it) doesn't download everything again.
+    Attach it to a WikiClient with response_cache=, or directly to a Site.
+
+    Responses are keyed by the wiki, the user and the normalized request parameters. They're used for ttl seconds,
+    and once the cache is larger than max_size bytes the least recently used responses are removed.
+    Anything that depends on the session (tokens, information about the user) or is about what just happened
+    (recent changes, logs, watchlist) is never cached, and neither are errors.
+
+    When a write action is made through a Site that has the cache, every cached response that mentions one of the
+    titles it changed is removed. Cargo query results can't be traced back to titles, so they're all removed then.
+
+    Responses can be up to ttl seconds old, and edits made by anyone else aren't noticed, so reads of text that's
+    going to be edited and saved bypass the cache (see Site.bypass_cache); WikiClient.get_pages_with_text, which
+    the page and template modifiers use, always does. get_simple_pages and other reads use the cache.
+
+    In replay mode, only recorded responses are used, and a read that could have been recorded but wasn't raises
+    ResponseNotRecorded instead of being sent to the wiki. Requests that are never cached, including all write
+    actions, and reads that bypass the cache are still sent to the wiki.
+    """
+    cached_actions = {'query', 'cargoquery', 'parse'}
+    # modules whose results are about the current session or are expected to change from one run to the next
+    uncached_modules = {'tokens', 'recentchanges', 'logevents', 'watchlist', 'watchlistraw', 'notifications'}
+    # parameters that don't change the content of the response
+    ignored_params = {'format', 'maxlag', 'assert', 'assertuser', 'requestid', 'curtimestamp', 'retry_on_error'}
+    # parameters whose values are lists in which the order doesn't matter
+    unordered_params = {'titles', 'pageids', 'revids', 'prop', 'list', 'meta'}
+    # when a page changes, cached responses from these actions are removed whatever titles they mention
+    untraceable_actions = {'cargoquery'}
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 24 * 60 * 60, max_size: int = 512 * 1024 * 1024,
+                 replay: bool = False):
+        """
+        :param path: The sqlite database to save responses in. Defaults to responses.sqlite3 in the mwcleric config path
+        :param ttl: How many seconds a response is used for before it's requested again
+        :param max_size: The most bytes of responses to keep
+        :param replay: Only use recorded responses, and raise ResponseNotRecorded for any other reads
+        """
+        self.path = path or os.path.join(AuthCredentials.config_path, 'responses.sqlite3')
+        self.ttl = ttl
+        self.max_size = max_size
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # we only use the connection while holding the lock, so it's fine to share it between threads
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._db.executescript("""
+                PRAGMA journal_mode = WAL;
+                PRAGMA synchronous = NORMAL;
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY, action TEXT, response TEXT, size INTEGER, saved REAL, used REAL);
+                CREATE TABLE IF NOT EXISTS titles (title TEXT, key TEXT);
+                CREATE INDEX IF NOT EXISTS titles_title ON titles (title);
+                CREATE INDEX IF NOT EXISTS titles_key ON titles (key);
+                CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+            """)
+        return self._db
+
+    def cacheable(self, action: str, params: dict) -> bool:
+        if action not in self.cached_actions:
+            return False
+        modules = set()
+        for key in ('list', 'prop', 'meta', 'generator'):
+            modules.update(str(params.get(key, '')).split('|'))
+        if modules & self.uncached_modules:
+            return False
+        # mwclient adds meta=userinfo with uiprop=blockinfo|hasmsg to every query, but anything else that asks
+        # about the user depends on who's logged in right now
+        if 'userinfo' in modules and params.get('uiprop') != 'blockinfo|hasmsg':
+            return False
+        return True
+
+    def key(self, wiki: str, user: Optional[str], action: str, params: dict) -> Optional[str]:
+        """
+        The key of a request, or None if its response shouldn't be cached
+
+        :param wiki: The wiki's url and path
+        :param user: The name of the user that's logged in
+        :param action: The api action
+        :param params: The rest of the request's parameters
+        """
+        if not self.cacheable(action, params):
+            return None
+        normalized = {}
+        for name, value in params.items():
+            if name in self.ignored_params or value is None:
+                continue
+            value = str(value)
+            if name in self.unordered_params:
+                value = '|'.join(sorted(set(value.split('|'))))
+            normalized[name] = value
+        text = json.dumps([wiki.split('@', 1)[-1], user, action, sorted(normalized.items())])
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Returns the saved response, or None if there isn't one that's still fresh"""
+        with self._lock:
+            db = self._connect()
+            row = db.execute('SELECT response, saved FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None and time.time() - row[1] > self.ttl:
+                self._delete_keys(db, [key])
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute('UPDATE responses SET used = ? WHERE key = ?', (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0], object_pairs_hook=OrderedDict)
+
+    def put(self, key: str, action: str, params: dict, response: dict):
+        """Saves a response, along with the titles it mentions so that it can be invalidated when they change"""
+        if not isinstance(response, dict) or 'error' in response:
+            return
+        text = json.dumps(response)
+        titles = self._titles(params, response)
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute('BEGIN')
+            try:
+                self._delete_keys(db, [key])
+                db.execute('INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?)', (key, action, text, len(text), now, now))
+                db.executemany('INSERT INTO titles VALUES (?, ?)', [(title, key) for title in titles])
+                self._evict(db)
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+
+    def invalidate_titles(self, titles: Iterable[str]):
+        """Removes every cached response that mentions any of the titles, and all Cargo query results"""
+        titles = list(titles)
+        if len(titles) == 0:
+            return
+        with self._lock:
+            db = self._connect()
+            keys = set()
+            for title in titles:
+                keys.update(key for key, in db.execute('SELECT key FROM titles WHERE title = ?', (title,)))
+            for action in self.untraceable_actions:
+                keys.update(key for key, in db.execute('SELECT key FROM responses WHERE action = ?', (action,)))
+            db.execute('BEGIN')
+            self._delete_keys(db, keys)
+            db.execute('COMMIT')
+
+    def clear(self):
+        with self._lock:
+            db = self._connect()
+            db.execute('DELETE FROM responses')
+            db.execute('DELETE FROM titles')
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    @staticmethod
+    def _delete_keys(db: sqlite3.Connection, keys: Iterable[str]):
+        keys = [(key,) for key in keys]
+        db.executemany('DELETE FROM responses WHERE key = ?', keys)
+        db.executemany('DELETE FROM titles WHERE key = ?', keys)
+
+    def _evict(self, db: sqlite3.Connection):
+        size = db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if size <= self.max_size:
+            return
+        expired = []
+        for key, response_size in db.execute('SELECT key, size FROM responses ORDER BY used'):
+            if size <= self.max_size:
+                break
+            expired.append(key)
+            size -= response_size
+        self._delete_keys(db, expired)
+
+    @staticmethod
+    def _titles(params: dict, response: dict) -> Set[str]:
+        titles = set()
+        for name in ('titles', 'page'):
+            if params.get(name):
+                titles.update(str(params[name]).split('|'))
+        query = response.get('query', {})
+        for key, value in query.items():
+            rows = list(value.values()) if key == 'pages' and isinstance(value, dict) else value
+            if not isinstance(rows, list):
+                continue
+            for row in rows:
+                if not isinstance(row, dict):
+                    continue
+                for name in ('title', 'from', 'to'):
+                    if isinstance(row.get(name), str):
+                        titles.add(row[name])
+        if 'parse' in response and 'title' in response['parse']:
+            titles.add(response['parse']['title'])
+        return titles
@@ -1,5 +1,7 @@
 from typing import Optional
 
+from mwclient.errors import APIError
+
 from mwcleric.auth_credentials import AuthCredentials
 from mwcleric.clients.site import Site
 
@@ -15,6 +17,7 @@ class SessionManager(object):
                    http_user: Optional[str] = None,
                    http_pw: Optional[str] = None,
                    user_agent: Optional[str] = None,
+                   siteinfo: Optional[dict] = None,
                    **kwargs):
         if http_user is not None and http_pw is not None:
             url = f"{http_user}:{http_pw}@{url}"
@@ -32,6 +35,7 @@ class SessionManager(object):
             max_retries=max_retries,
             clients_useragent=user_agent,
             custom_headers=dict(),
+            siteinfo=siteinfo,
             **kwargs
         )
 
@@ -46,6 +50,14 @@ class SessionManager(object):
             client = Site(url, **client_kwargs)
         if credentials:
             client.login(username=credentials.username, password=credentials.password)
+        elif siteinfo is not None:
+            # we still need to know who we are (and what rights we have) even though siteinfo was cached
+            try:
+                client.site_init()
+            except APIError as e:
+                # private wiki, same as mwclient does when initializing
+                if e.args[0] not in {'unknown_action', 'readapidenied'}:
+                    raise
         self.existing_wikis[process_cache_key] = {'client': client}
         return client
 
@@ -1,6 +1,166 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict
+
 from mwclient import Site as MwclientSite
 
+from mwcleric.clients.instrumentation import Instrumentation, ApiEvent
+from mwcleric.clients.response_cache import ResponseCache
+from mwcleric.errors import ResponseNotRecorded
+
+_last_response = threading.local()
+_cache_bypass = threading.local()
+
+
+def _on_response(response, *args, **kwargs):
+    _last_response.wait = {
+        'retry_after': response.headers.get('retry-after'),
+        'lag': response.headers.get('x-database-lag'),
+    }
+    # only set while an instrumented api call is being made from this thread
+    responses = getattr(_last_response, 'responses', None)
+    if responses is not None:
+        responses.append((len(response.content), response.elapsed.total_seconds()))
+
+
+def server_requested_wait() -> Dict[str, Optional[str]]:
+    """
+    The Retry-After and X-Database-Lag headers of the last response received by this thread, so that we can
+    wait as long as the server asked after mwclient gives up
+    """
+    return getattr(_last_response, 'wait', {})
+
 
 class Site(MwclientSite):
     """Wrap mwclient since we might include a site object in constructors"""
-    pass
+    # actions that change something on the wiki, which should wait for lagged replicas to catch up
+    write_actions = {'edit', 'move', 'delete', 'undelete', 'protect', 'rollback', 'patrol', 'purge', 'upload',
+                     'import', 'cargorecreatetables'}
+    # the parameters that say which api modules are used, which api calls are grouped by when instrumented
+    module_params = ('list', 'prop', 'meta', 'generator', 'tables')
+    # the parameters of write actions that are titles of pages that the action changes
+    title_params = ('title', 'titles', 'from', 'to')
+    instrumentation: Optional[Instrumentation] = None
+    response_cache: Optional[ResponseCache] = None
+
+    def __init__(self, host, *args, siteinfo: Optional[dict] = None, write_maxlag: Optional[int] = None,
+                 instrumentation: Optional[Instrumentation] = None, response_cache: Optional[ResponseCache] = None,
+                 **kwargs):
+        """
+        :param siteinfo: Output of dump_siteinfo() from an earlier Site for the same wiki. If given, the site is
+            initialized from this instead of requesting siteinfo. Information about the current user is not
+            included, so call site_init() (or login()) afterwards to get that.
+        :param write_maxlag: If given, send this as maxlag with every write action, so that the wiki tells us to
+            wait when its database replicas are lagged by more than this many seconds
+        :param instrumentation: If given, every api call made through the site is reported to it
+        :param response_cache: If given, responses of read-only api calls are saved to it and reused
+        """
+        if siteinfo is not None:
+            kwargs['do_init'] = False
+        self.write_maxlag = write_maxlag
+        self.instrumentation = instrumentation
+        self.response_cache = response_cache
+        # the connection is created by mwclient, so set up the hook as soon as possible
+        super().__init__(host, *args, **kwargs)
+        if _on_response not in self.connection.hooks['response']:
+            self.connection.hooks['response'].append(_on_response)
+        if siteinfo is not None:
+            self.load_siteinfo(siteinfo)
+
+    def raw_api(self, action, http_method='POST', *args, **kwargs):
+        if self.response_cache is None:
+            return self._raw_api(action, http_method, *args, **kwargs)
+        if action in self.write_actions:
+            try:
+                return self._raw_api(action, http_method, *args, **kwargs)
+            finally:
+                # whether or not it worked, we can't be sure that the pages are unchanged
+                self.response_cache.invalidate_titles(
+                    title for key in self.title_params if kwargs.get(key) for title in str(kwargs[key]).split('|'))
+        key = self.response_cache.key('{}{}'.format(self.host, self.path), getattr(self, 'username', None),
+                                      action, kwargs)
+        if key is None:
+            return self._raw_api(action, http_method, *args, **kwargs)
+        bypass = getattr(_cache_bypass, 'active', False)
+        result = self.response_cache.get(key) if not bypass else None
+        if result is not None:
+            return result
+        if self.response_cache.replay and not bypass:
+            raise ResponseNotRecorded(action, kwargs)
+        result = self._raw_api(action, http_method, *args, **kwargs)
+        self.response_cache.put(key, action, kwargs, result)
+        return result
+
+    @contextmanager
+    def bypass_cache(self):
+        """
+        Sends the read-only api calls made by this thread inside the block to the wiki even if their responses are
+        cached (or the cache is in replay mode), and caches the new responses instead. Use this for anything that's
+        going to be edited and saved, so that it's never based on an old version of a page.
+        """
+        previous = getattr(_cache_bypass, 'active', False)
+        _cache_bypass.active = True
+        try:
+            yield
+        finally:
+            _cache_bypass.active = previous
+
+    def _raw_api(self, action, http_method='POST', *args, **kwargs):
+        if self.write_maxlag is not None and action in self.write_actions and 'maxlag' not in kwargs:
+            kwargs['maxlag'] = self.write_maxlag
+        if self.instrumentation is None:
+            return super().raw_api(action, http_method, *args, **kwargs)
+        responses = []
+        _last_response.responses = responses
+        error = None
+        start = time.perf_counter()
+        try:
+            result = super().raw_api(action, http_method, *args, **kwargs)
+            if isinstance(result, dict) and 'error' in result:
+                error = result['error'].get('code')
+            return result
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            _last_response.responses = None
+            titles = kwargs.get('titles') or kwargs.get('pageids')
+            self.instrumentation.emit(ApiEvent(
+                action=action,
+                params=self._module_params(kwargs),
+                titles=len(str(titles).split('|')) if titles else 0,
+                latency=latency,
+                wait=max(latency - sum(elapsed for _, elapsed in responses), 0),
+                response_bytes=sum(size for size, _ in responses),
+                retries=max(len(responses) - 1, 0),
+                error=error,
+            ))
+
+    def _module_params(self, kwargs: dict) -> Dict[str, str]:
+        params = {key: str(kwargs[key]) for key in self.module_params if key in kwargs}
+        if 'meta' in params:
+            # mwclient adds meta=userinfo to every query to check that we're still logged in, leave that out
+            meta = dict.fromkeys(params['meta'].split('|'))
+            if kwargs.get('uiprop') == 'blockinfo|hasmsg':
+                meta.pop('userinfo', None)
+            if meta:
+                params['meta'] = '|'.join(meta)
+            else:
+                params.pop('meta')
+        return params
+
+    def load_siteinfo(self, siteinfo: dict):
+        self.site = siteinfo['general']
+        # json turns the namespace ids into strings
+        self.namespaces = {int(ns): name for ns, name in siteinfo['namespaces'].items()}
+        self.version = self.version_tuple_from_generator(self.site['generator'])
+        self.require(1, 16)
+        self.initialized = True
+
+    def dump_siteinfo(self) -> Optional[dict]:
+        """The information that load_siteinfo needs, or None if the site hasn't been initialized yet"""
+        if not self.initialized:
+            return None
+        return {'general': self.site, 'namespaces': self.namespaces}
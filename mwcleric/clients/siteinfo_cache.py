@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+from mwcleric.auth_credentials import AuthCredentials
+
+
+class SiteinfoCache(object):
+    """
+    Saves information about a wiki that almost never changes (general siteinfo, namespaces and their aliases,
+    extensions, localized messages) to disk, so that new clients for the same wiki can start up without
+    requesting it again.
+
+    Each wiki is stored in its own json file, keyed by its url and path. Each entry remembers when it was saved,
+    and entries older than ttl seconds are ignored and will be requested again, even if other entries for the same
+    wiki were saved since; call invalidate after changing a wiki's configuration to do that sooner.
+    """
+
+    def __init__(self, directory: Optional[str] = None, ttl: float = 24 * 60 * 60):
+        """
+        :param directory: Where to save the cache files. Defaults to a siteinfo folder in the mwcleric config path
+        :param ttl: How many seconds the information about a wiki is used for before it's requested again
+        """
+        self.directory = directory or os.path.join(AuthCredentials.config_path, 'siteinfo')
+        self.ttl = ttl
+
+    def _file(self, url: str, path: str) -> str:
+        # leave out any http auth so that it doesn't end up in a file name (or change the key)
+        url = url.split('@', 1)[-1]
+        key = hashlib.sha1('{}{}'.format(url, path).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + '.json')
+
+    def _read(self, url: str, path: str) -> dict:
+        try:
+            with open(self._file(url, path), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        siteinfo = data.get('siteinfo', {})
+        saved = data.get('saved', {})
+        if not isinstance(saved, dict):
+            # files written before entries had their own timestamps
+            saved = {key: saved for key in siteinfo}
+        return {key: (value, saved.get(key, 0)) for key, value in siteinfo.items()}
+
+    def load(self, url: str, path: str) -> dict:
+        """
+        Returns everything that's been saved for the wiki and hasn't expired, or an empty dict if nothing has
+        """
+        now = time.time()
+        return {key: value for key, (value, saved) in self._read(url, path).items() if now - saved <= self.ttl}
+
+    def save(self, url: str, path: str, siteinfo: dict):
+        """
+        Overwrites the saved information about the wiki. Entries that are the same as what was already saved keep
+        the time they were first saved, so that adding one entry doesn't make the others last longer.
+        The file is replaced atomically so that several processes starting up at once will never read half of a file.
+        """
+        now = time.time()
+        previous = self._read(url, path)
+        saved = {}
+        for key, value in siteinfo.items():
+            previous_value, previous_saved = previous.get(key, (None, now))
+            # compare them as json, since e.g. json turns the namespace ids into strings
+            saved[key] = previous_saved if previous_value == json.loads(json.dumps(value)) else now
+        os.makedirs(self.directory, exist_ok=True)
+        file = self._file(url, path)
+        tmp_file = '{}.{}.tmp'.format(file, os.getpid())
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'url': url.split('@', 1)[-1], 'path': path, 'saved': saved, 'siteinfo': siteinfo}, f)
+        os.replace(tmp_file, file)
+
+    def invalidate(self, url: str, path: str):
+        """Deletes the saved information about the wiki, so it will be requested again next time"""
+        try:
+            os.remove(self._file(url, path))
+        except FileNotFoundError:
+            pass
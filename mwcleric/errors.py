@@ -33,3 +33,13 @@ class RetriedLoginAndStillFailed(AssertUserFailedError):
 
 class InvalidNamespaceName(KeyError):
     pass
+
+
+class ResponseNotRecorded(KeyError):
+    def __init__(self, action, params):
+        self.action = action
+        self.params = params
+
+    def __str__(self):
+        return "No recorded response for this request in replay mode. Action: {}, params: {}".format(
+            self.action, self.params)
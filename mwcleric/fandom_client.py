@@ -1,4 +1,4 @@
-from typing import Union, List
+from typing import Union, List, Optional
 
 from mwclient import InvalidResponse
 
@@ -34,9 +34,11 @@ class FandomClient(WikiClient):
 
         self.cargo_client = CargoClient(self.client)
 
-    def relog(self):
-        super().relog()
-        self.cargo_client = CargoClient(self.client)
+    def relog(self, stale_client: Optional[Site] = None):
+        client = self.client
+        super().relog(stale_client)
+        if self.client is not client:
+            self.cargo_client = CargoClient(self.client)
 
     def login(self):
         if self.credentials is None:
@@ -47,27 +49,29 @@ class FandomClient(WikiClient):
             self.url = self.url.replace('gamepedia', 'fandom')
             self.relog()
 
-    def search(self, search_term: str, title_list: List[str], limit: int = 500):
+    def search(self, search_term: str, title_list: List[str], limit: Optional[int] = None, concurrency: int = 1):
         """
         Searches a specified list of titles for a given term. A replacement for Fandom's lack of insource search.
 
         This method paginates the requests to fetch page sources, so it's relatively efficient, especially if you are
-        logged in as an administrator with apihighlimits.
+        logged in as an administrator with apihighlimits, which will be detected automatically.
 
         :param search_term: The term to search
         :param title_list: A list of page titles.
-        :param limit: The pagination limit when querying for page texts. If you are logged out or not a systop, probably 50.
+        :param limit: Optional - the pagination limit when querying for page texts. By default, the most the api allows.
+        :param concurrency: How many batches of page texts to fetch at once
         :return: Nothing, will print a list of the results
         """
 
         # TODO: Add regex support
 
-        page_list = self.get_simple_pages(title_list, limit=limit)
-        for page in page_list:
-            if search_term in page.text:
-                print(page.name)
+        for batch in self.get_simple_pages_iter(title_list, limit=limit, concurrency=concurrency):
+            for page in batch:
+                if search_term in page.text:
+                    print(page.name)
 
-    def search_namespace(self, search_term: str, namespace: Union[int, str], limit: int = 500):
+    def search_namespace(self, search_term: str, namespace: Union[int, str], limit: Optional[int] = None,
+                         concurrency: int = 1):
         """
         Searches a specified namespace for a search term.
 
@@ -75,10 +79,12 @@ class FandomClient(WikiClient):
 
         :param search_term: The term to search
         :param namespace: The namespace within which to search for the term.
-        :param limit: The pagination limit when querying for page texts. If you are logged out or not a systop, probably 50.
+        :param limit: Optional - the pagination limit when querying for page texts. By default, the most the api allows.
+        :param concurrency: How many batches of page texts to fetch at once
         :return: Nothing, will print a list of the results
         """
 
         if isinstance(namespace, str):
             namespace = self.get_ns_number(namespace)
-        self.search(search_term, self.client.allpages(namespace=namespace, generator=False), limit=limit)
+        self.search(search_term, self.client.allpages(namespace=namespace, generator=False), limit=limit,
+                    concurrency=concurrency)
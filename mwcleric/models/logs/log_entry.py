@@ -1,12 +1,43 @@
+from typing import Optional
+
+from mwclient.page import Page
+
+from mwcleric.models.logs.page_resolver import PageResolver
 from mwcleric.wiki_client import WikiClient
 
 
 class LogEntry(object):
-    def __init__(self, log, site: WikiClient):
+    """
+    A single log event. The fields are taken directly from the api's data; page is only looked up when
+    it's first used, together with the pages of every other entry that shares the same resolver.
+    """
+    __slots__ = ('site', 'log_type', 'title', 'logid', 'comment', 'user', 'timestamp', 'params', '_resolver', '_page')
+
+    def __init__(self, log, site: WikiClient, resolver: Optional[PageResolver] = None):
+        """
+        :param log: A log event as returned by the api (list=logevents)
+        :param site: WikiClient
+        :param resolver: Optional - a PageResolver shared with other entries, to look up their pages together
+        """
         self.site = site
         self.log_type = log['type']
         self.title = log['title']
-        self.page = site.client.pages[self.title]
-        self.logid = log['logid']
-        self.comment = log['comment']
-        self.user = log['user']
+        self.logid = log.get('logid')
+        self.comment = log.get('comment')
+        self.user = log.get('user')
+        self.timestamp = log.get('timestamp')
+        self.params = log.get('params', {})
+        self._resolver = resolver if resolver is not None else PageResolver(site)
+        self._resolver.add(self.title)
+        self._page: Optional[Page] = None
+
+    @property
+    def page(self) -> Page:
+        if self._page is not None:
+            return self._page
+        return self._resolver.get(self.title)
+
+    @page.setter
+    def page(self, page: Page):
+        # kept on this entry rather than in the resolver, so that other entries sharing it aren't affected
+        self._page = page
@@ -0,0 +1,30 @@
+from itertools import islice
+from typing import Iterable, Generator
+
+from mwcleric.models.logs.log_entry import LogEntry
+from mwcleric.models.logs.move_log_entry import MoveLogEntry
+from mwcleric.models.logs.page_resolver import PageResolver
+from mwcleric.wiki_client import WikiClient
+
+
+def stream_log_entries(site: WikiClient, logs: Iterable[dict]) -> Generator[LogEntry, None, None]:
+    """
+    Wraps log events from the api (e.g. from WikiClient.logs_by_interval_iter) in LogEntry objects,
+    or MoveLogEntry objects for moves. Each group of up to the titles limit of entries shares a PageResolver,
+    so their pages are looked up in a single request if and when any of them is needed.
+
+    :param site: WikiClient
+    :param logs: An iterable of log events as returned by the api
+    :return: A generator of LogEntry objects
+    """
+    logs = iter(logs)
+    while True:
+        batch = list(islice(logs, site.titles_limit))
+        if len(batch) == 0:
+            return
+        resolver = PageResolver(site)
+        for log in batch:
+            if log['type'] == 'move':
+                yield MoveLogEntry(log, site, resolver)
+            else:
+                yield LogEntry(log, site, resolver)
@@ -1,9 +1,14 @@
+from typing import Optional
+
 from mwcleric.models.logs.log_entry import LogEntry
+from mwcleric.models.logs.page_resolver import PageResolver
 from mwcleric.wiki_client import WikiClient
 
 
 class MoveLogEntry(LogEntry):
-    def __init__(self, log, site: WikiClient):
-        super().__init__(log, site)
-        self.title = log['params']['target_title']
-        self.page = site.client.pages[self.title]
+    __slots__ = ()
+
+    def __init__(self, log, site: WikiClient, resolver: Optional[PageResolver] = None):
+        # title and page are those of the target of the move
+        log = dict(log, title=log['params']['target_title'])
+        super().__init__(log, site, resolver)
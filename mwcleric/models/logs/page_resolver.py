@@ -0,0 +1,30 @@
+from typing import Dict, List, Optional
+
+from mwclient.page import Page
+
+from mwcleric.wiki_client import WikiClient
+
+
+class PageResolver(object):
+    """
+    Turns a group of titles into Page objects all at once, the first time any one of them is needed.
+    Log entries from the same batch share a resolver, so touching entry.page costs one request per batch
+    instead of one request per entry, and nothing at all if no page is ever needed.
+    """
+    __slots__ = ('site', '_titles', '_pages')
+
+    def __init__(self, site: WikiClient, titles: Optional[List[str]] = None):
+        self.site = site
+        self._titles = list(titles) if titles is not None else []
+        self._pages: Dict[str, Page] = {}
+
+    def add(self, title: str):
+        self._titles.append(title)
+
+    def get(self, title: str) -> Page:
+        if title not in self._pages:
+            # resolve every title that hasn't been yet, including any that were added since the last time
+            titles = [t for t in dict.fromkeys(self._titles + [title]) if t not in self._pages]
+            self._pages.update(zip(titles, self.site.get_pages(titles)))
+            self._titles = []
+        return self._pages[title]
@@ -0,0 +1,64 @@
+from typing import Callable, Dict, Optional, Union
+
+from mwparserfromhell.nodes import Template
+
+from .template_modifier import TemplateModifierBase
+from .wiki_client import WikiClient
+
+
+class MultiTemplateModifier(TemplateModifierBase):
+    """
+    Update several templates in a single pass over the wiki. Each page that uses any of the templates is
+    fetched and parsed once, every matching template on it is passed to the handler for that template,
+    and the page is saved at most once, with a summary that lists the templates that were found on it.
+
+    Handlers are called with the template node and should modify it in place, just like
+    TemplateModifierBase.update_template. They can be methods of a subclass, in which case they can also use
+    self.current_page, self.current_template_name, self.remove_from_page() etc.
+    """
+
+    def __init__(self, site: WikiClient, templates: Dict[str, Callable[[Template], None]],
+                 page_list=None, title_list=None, limit=-1, summary=None,
+                 quiet=False, lag=0, tags=None, skip_pages=None,
+                 recursive=True,
+                 startat_page=None,
+                 namespace: Optional[Union[int, str]] = None,
+                 workers: int = 1, edits_per_minute: Optional[float] = None,
+                 follow_redirects: bool = True,
+                 **data):
+        """
+
+        :param site: WikiClient site
+        :param templates: A dict from the name of each template to modify to the handler for that template
+        :param page_list: A default page_list parameter. Otherwise every page using any of the templates will be used
+        :param title_list: See page_list.
+        :param limit: See PageModifier class.
+        :param summary: Edit summary, the names of the templates found on each page will be added to it
+        :param quiet: See PageModifier class.
+        :param lag: See PageModifier class.
+        :param tags: See PageModifier class.
+        :param skip_pages: See PageModifier class.
+        :param recursive: See mwparserfromhell.wikitext.filter_templates method
+        :param startat_page: See PageModifier class
+        :param namespace: Do we filter the templates' used_in lists?
+        :param workers: See PageModifier class.
+        :param edits_per_minute: See PageModifier class.
+        :param follow_redirects: See TemplateModifier class.
+        :param data: Extra keywords to save to the class for use in the handlers
+        """
+        self.handlers = templates
+        if title_list is None and not page_list:
+            page_list = site.pages_using_iter(list(templates.keys()), namespace=namespace)
+        super().__init__(site, list(templates.keys()), page_list=page_list, title_list=title_list, limit=limit,
+                         summary=summary, quiet=quiet, lag=lag, tags=tags, skip_pages=skip_pages,
+                         recursive=recursive, startat_page=startat_page, namespace=namespace,
+                         workers=workers, edits_per_minute=edits_per_minute,
+                         follow_redirects=follow_redirects, **data)
+
+    def update_template(self, template):
+        self.handlers[self.current_template_name](template)
+
+    def get_summary(self):
+        if len(self.matched_templates) == 0:
+            return self.summary
+        return '{} ({})'.format(self.summary, ', '.join(sorted(self.matched_templates)))
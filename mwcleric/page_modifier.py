@@ -1,11 +1,56 @@
+import io
+import pickle
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import islice
+from typing import Optional, Union
+
 from mwclient.page import Page
 from mwparserfromhell import parse
 from time import sleep
 
 from mwparserfromhell.wikicode import Wikicode
 
+from .models.simple_page import SimplePage
+from .rate_limiter import RateLimiter
+from .run_profile import RunProfile
 from .wiki_client import WikiClient
 
+# the copy of the modifier that each worker process uses when PageModifierBase is run with processes > 1
+_worker_modifier = None
+
+
+def _init_worker(modifier_state: bytes):
+    global _worker_modifier
+    _worker_modifier = _ModifierUnpickler(io.BytesIO(modifier_state)).load()
+
+
+def _transform_in_worker(title: str, text: str, profile: bool):
+    _worker_modifier.current_page = SimplePage(name=title, text=text, exists=True)
+    _worker_modifier._page_times = {} if profile else None
+    newtext = _worker_modifier.transform_text(text)
+    return newtext, _worker_modifier.get_summary(), _worker_modifier._page_times
+
+
+class _ModifierPickler(pickle.Pickler):
+    """Pickles a modifier for a worker process, leaving out the parts that only the parent process needs"""
+
+    def __init__(self, file, skip):
+        super().__init__(file)
+        self.skip = {id(obj) for obj in skip if obj is not None}
+
+    def persistent_id(self, obj):
+        if id(obj) in self.skip:
+            return 'skipped'
+        return None
+
+
+class _ModifierUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return None
+
 
 class PageModifierBase(object):
     """
@@ -25,6 +70,17 @@ class PageModifierBase(object):
 
     * page_list is a list of Page objects (for example maybe site.client.categories)
     * title_list is a list of strings which will be turned into Page objects
+
+    If processes is more than 1, parsing and the update methods are run in a pool of worker processes while this
+    process takes care of fetching and saving. This only helps if processing pages is CPU-bound (e.g. very large pages).
+    The modifier is pickled to be sent to the workers, without self.site or the page/title list, so it can't use
+    those from update_plaintext/update_wikitext, and self.current_page will be a SimplePage rather than an mwclient
+    Page. Changes made to self in a worker are not sent back. If the modifier can't be pickled, a warning is given and
+    pages are processed in this process instead.
+
+    If workers is more than 1, saves are done in the background by a pool of threads while the next pages are
+    fetched and processed. Saves are then spaced out by edits_per_minute (shared by all workers) instead of by
+    sleeping for lag seconds before each one, and any errors from saving are raised in the same order as the pages.
     """
     current_page: Page = None
     current_text: str = None
@@ -34,7 +90,8 @@ class PageModifierBase(object):
 
     def __init__(self, site: WikiClient, page_list=None, title_list=None, limit=-1, summary=None, startat_page=None,
                  tags=None, skip_pages=None,
-                 quiet=False, lag=0, **data):
+                 quiet=False, lag=0, workers: int = 1, edits_per_minute: Optional[float] = None,
+                 processes: int = 1, api_report: bool = False, profile: Union[bool, RunProfile] = False, **data):
         """Create a PageModifier object, which can perform operations to edit the plaintext
         or wikitext of a page.
 
@@ -46,6 +103,13 @@ class PageModifierBase(object):
         :param startat_page: skip to this page
         :param quiet: don't print any console output (set to True for cron processes)
         :param lag: sleep this many seconds before saving
+        :param workers: save pages using this many threads at once
+        :param edits_per_minute: if workers > 1, the maximum rate of saves for all workers together.
+            Defaults to one edit per lag seconds, or no limit if lag is 0
+        :param processes: parse and process pages using this many processes at once
+        :param api_report: print a summary of the api calls made by the site at the end of run() (unless quiet)
+        :param profile: time each phase of processing each page, and print a summary at the end of run()
+            (unless quiet). Pass a RunProfile to configure it; either way it's available as self.profile
         :param data: Extra keywords to save to the class for use in the update_wikitext/update_plaintext methods
         """
         self.title_list = title_list
@@ -61,6 +125,21 @@ class PageModifierBase(object):
         self.tags = tags
         self.data = data
         self.lmt = 0
+        self.workers = workers
+        if edits_per_minute is None and lag:
+            edits_per_minute = 60 / lag
+        self.rate_limiter = RateLimiter(edits_per_minute)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending_saves = deque()
+        self.processes = processes
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self.api_report = api_report
+        if profile is True:
+            profile = RunProfile()
+        self.profile: Optional[RunProfile] = profile or None
+        # the times of each phase for the current page, only while profiling
+        self._page_times: Optional[dict] = None
+        self._fetch_share = 0.0
 
     def _print(self, s):
         """Print iff the quiet flag is not set to True"""
@@ -83,6 +162,18 @@ class PageModifierBase(object):
         self.prioritize_wikitext = True
         return text
 
+    def get_summary(self):
+        """The edit summary to use when saving the current page"""
+        return self.summary
+
+    def page_may_change(self, text):
+        """This will be run iff page_may_change isn't overridden in a subclass.
+
+        Return False if the page's text can't possibly be changed by this modifier,
+        in which case it will be skipped without being parsed.
+        """
+        return True
+
     def postprocess_plaintext(self, text):
         """This method may not be supported forever, do not use it!!!
 
@@ -93,45 +184,234 @@ class PageModifierBase(object):
 
     def run(self):
         if self.page_list is not None:
-            for page in self.page_list:
-                if not self.process_page(page):
-                    break
+            pages = iter(self.page_list)
         elif self.title_list is not None:
-            for title in self.title_list:
-                page = self.site.client.pages[title]
+            pages = iter(self.title_list)
+        else:
+            return
+        if self.api_report:
+            self.site.instrument()
+        if self.profile is not None:
+            self.profile.start()
+        if self.workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        if self.processes > 1:
+            self._process_pool = self._start_process_pool()
+        try:
+            if self._process_pool is not None:
+                self._run_pages_in_processes(pages)
+            else:
+                self._run_pages(pages)
+            self._collect_saves()
+        finally:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=True)
+                self._process_pool = None
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            self._pending_saves.clear()
+            if self.api_report:
+                self._print(self.site.instrumentation.report())
+            if self.profile is not None:
+                self.profile.finish()
+                self._print(self.profile.report())
+
+    def _start_process_pool(self) -> Optional[ProcessPoolExecutor]:
+        f = io.BytesIO()
+        skip = [self.site, self.page_list, self.title_list, self.rate_limiter, self._executor, self._pending_saves,
+                self.profile]
+        try:
+            _ModifierPickler(f, skip).dump(self)
+        except Exception as e:
+            warnings.warn('Could not pickle {} to send it to worker processes, so pages will be processed in this '
+                          'process instead. Error: {!r}'.format(type(self).__name__, e))
+            return None
+        return ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker,
+                                   initargs=(f.getvalue(),))
+
+    def _run_pages(self, pages):
+        # fetch the text of a whole window of pages at once rather than one page at a time
+        while self.lmt != self.limit:
+            window = list(islice(pages, self._window_size()))
+            if len(window) == 0:
+                return
+            for page in self._fetch_window(window):
                 if not self.process_page(page):
+                    return
+
+    def _fetch_window(self, window):
+        # decide which pages to skip from their titles, so that we never fetch the text of a page we're skipping
+        window = [page for page in window if self._should_process(page)]
+        if len(window) == 0:
+            return []
+        if self.profile is None:
+            return self.site.get_pages_with_text(window)
+        start = time.perf_counter()
+        pages = self.site.get_pages_with_text(window)
+        # we can't tell how long each page took, so share the time out equally
+        self._fetch_share = (time.perf_counter() - start) / len(window)
+        return pages
+
+    def _run_pages_in_processes(self, pages):
+        pending = deque()
+        while self.lmt != self.limit:
+            window = list(islice(pages, self._window_size()))
+            if len(window) == 0:
+                break
+            submitted = 0
+            for page in self._fetch_window(window):
+                if self.lmt == self.limit:
                     break
+                self.lmt += 1
+                self._start_page_times()
+                text = page.text()
+                if not self._timed('prefilter', self.page_may_change, text):
+                    self._print('Skipping page %s...' % page.name)
+                    self._finish_page_times(page)
+                    continue
+                future = self._process_pool.submit(_transform_in_worker, page.name, text,
+                                                   self._page_times is not None)
+                pending.append((page, future, self._page_times))
+                submitted += 1
+            # save the previous window's results while the workers process this one
+            while len(pending) > submitted:
+                self._finish_in_process(*pending.popleft())
+        while len(pending) > 0:
+            self._finish_in_process(*pending.popleft())
+
+    def _finish_in_process(self, page: Page, future, page_times: Optional[dict] = None):
+        newtext, summary, worker_times = future.result()
+        self._page_times = page_times
+        if page_times is not None and worker_times is not None:
+            page_times.update(worker_times)
+        if newtext is None:
+            self._print('Skipping page %s...' % page.name)
+        else:
+            self.current_page = page
+            self._save(page, newtext, summary)
+        self._finish_page_times(page)
+
+    def _window_size(self):
+        size = self.site.titles_limit
+        if self.limit >= 0:
+            # don't fetch a bunch of pages that we're never going to look at
+            size = min(size, max(self.limit - self.lmt, 1))
+        return size
+
+    def _should_process(self, page: Union[Page, str]):
+        name = page if isinstance(page, str) else page.name
+        if self.startat_page and name == self.startat_page:
+            self.passed_startat = True
+        if not self.passed_startat:
+            self._print("Skipping page %s, before startat" % name)
+            return False
+        if name in self.skip_pages:
+            self._print("Skipping page %s as requested" % name)
+            return False
+        return True
 
     def process_page(self, page):
         if self.lmt == self.limit:
             return False
-        if self.startat_page and page.name == self.startat_page:
-            self.passed_startat = True
-        if not self.passed_startat:
-            self._print("Skipping page %s, before startat" % page.name)
-            return True
-        if page.name in self.skip_pages:
-            self._print("Skipping page %s as requested" % page.name)
+        if not self._should_process(page):
+            self._skip_page_times()
             return True
         self.lmt += 1
-        self.current_text = page.text()
+        self._start_page_times()
+        # if the page came from run() then its text has already been fetched, so this won't make a request
+        original_text = self._timed('fetch', page.text)
+        if not self._timed('prefilter', self.page_may_change, original_text):
+            self._print('Skipping page %s...' % page.name)
+            self._finish_page_times(page)
+            return True
         self.current_page = page
-        self.current_wikitext = parse(self.current_text)
-        self.current_text = self.update_plaintext(self.current_text)
-        self.update_wikitext(self.current_wikitext)
-        newtext = str(self.current_wikitext)
+        newtext = self.transform_text(original_text)
+        if newtext is None:
+            self._print('Skipping page %s...' % page.name)
+        else:
+            self._save(page, newtext, self.get_summary())
+        self._finish_page_times(page)
+        return True
+
+    def _start_page_times(self):
+        if self.profile is not None:
+            self._page_times = {'fetch': self._fetch_share}
+
+    def _skip_page_times(self):
+        if self.profile is not None:
+            self.profile.add_time('fetch', self._fetch_share)
+
+    def _finish_page_times(self, page):
+        if self.profile is not None and self._page_times is not None:
+            self.profile.add_page(page.name, self._page_times)
+        self._page_times = None
+
+    def _timed(self, phase: str, f, *args):
+        """Calls f, and if profiling, adds the time it took to the current page's time for the phase"""
+        if self._page_times is None:
+            return f(*args)
+        start = time.perf_counter()
+        try:
+            return f(*args)
+        finally:
+            self._page_times[phase] = self._page_times.get(phase, 0.0) + time.perf_counter() - start
+
+    def transform_text(self, text):
+        """Runs all of the update methods on the text of the current page
+
+        :return: The new text to save, or None if the page doesn't need to be saved
+        """
+        self.current_text = text
+        self.current_wikitext = self._timed('parse', parse, self.current_text)
+        self.current_text = self._timed('update_plaintext', self.update_plaintext, self.current_text)
+        self._timed('update_wikitext', self.update_wikitext, self.current_wikitext)
+        newtext = self._timed('postprocess', str, self.current_wikitext)
 
         # TODO: If mwparserfromhell has better support for removing nodes from wikitext,
         # delete postprocess_plaintext method
-        newtext = self.postprocess_plaintext(newtext)
-        if newtext != self.current_page.text() and not self.prioritize_plaintext:
-            self._print('Saving page %s...' % page.name)
-            sleep(self.lag)
-            self.site.save(page, newtext, summary=self.summary, tags=self.tags)
-        elif self.current_text != self.current_page.text():
-            self._print('Saving page %s...' % page.name)
-            sleep(self.lag)
-            self.site.save(page, self.current_text, summary=self.summary, tags=self.tags)
-        else:
-            self._print('Skipping page %s...' % page.name)
-        return True
+        newtext = self._timed('postprocess', self.postprocess_plaintext, newtext)
+        if newtext != text and not self.prioritize_plaintext:
+            return newtext
+        elif self.current_text != text:
+            return self.current_text
+        return None
+
+    def _save(self, page: Page, text: str, summary: str):
+        self._print('Saving page %s...' % page.name)
+        if self._executor is None:
+            self._timed('lag', sleep, self.lag)
+            self._timed('save', self._save_now, page, text, summary)
+            return
+        future = self._executor.submit(self._save_in_worker, page, text, summary)
+        self._pending_saves.append((page, future))
+        # don't let a backlog of saves pile up in memory if saving is slower than everything else
+        self._collect_saves(max_pending=2 * self.workers)
+
+    def _save_now(self, page: Page, text: str, summary: str):
+        self.site.save(page, text, summary=summary, tags=self.tags)
+
+    def _save_in_worker(self, page: Page, text: str, summary: str):
+        if self.profile is None:
+            self.rate_limiter.wait()
+            self._save_now(page, text, summary)
+            return
+        start = time.perf_counter()
+        self.rate_limiter.wait()
+        saving = time.perf_counter()
+        self._save_now(page, text, summary)
+        self.profile.add_time('lag', saving - start)
+        self.profile.add_time('save', time.perf_counter() - saving)
+
+    def _collect_saves(self, max_pending: Optional[int] = None):
+        """
+        Report on finished saves in the order they were submitted, raising the first error if there is one.
+        Waits for saves to finish until no more than max_pending are left, or until all are done if it's None.
+        """
+        while len(self._pending_saves) > 0:
+            page, future = self._pending_saves[0]
+            if max_pending is not None and len(self._pending_saves) <= max_pending and not future.done():
+                return
+            self._pending_saves.popleft()
+            future.result()
+            self._print('Saved page %s' % page.name)
@@ -0,0 +1,29 @@
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter(object):
+    """
+    Spaces out actions evenly so that no more than a given number of them start per minute.
+    A single RateLimiter can be shared between threads, in which case the limit applies to all of them together.
+    """
+
+    def __init__(self, per_minute: Optional[float] = None):
+        """
+        :param per_minute: Maximum number of actions per minute. If None or 0, wait() will never sleep.
+        """
+        self.interval = 60 / per_minute if per_minute else 0
+        self._next_start = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Sleep until the next action is allowed to start"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
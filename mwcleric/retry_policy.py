@@ -0,0 +1,125 @@
+import re
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+
+from mwclient.errors import APIError, AssertUserFailedError, MaximumRetriesExceeded
+from requests.exceptions import ConnectionError as RequestsConnectionError, HTTPError, Timeout
+
+from mwcleric.clients.site import server_requested_wait
+
+
+class RetryPolicy(object):
+    """
+    Decides how WikiClient retries write actions that failed: which errors are worth logging in again for,
+    and how long to wait before each retry.
+
+    Errors are sorted into classes:
+
+    * auth - we were logged out or our token is bad, so we log in again before retrying
+    * network - timeouts, connection errors and 5xx responses
+    * lag - the wiki's database replicas are lagged by more than the maxlag we sent
+    * ratelimit - we are sending too many requests
+    * other - anything else the api returned
+
+    For lag and ratelimit errors we wait for as long as the server asks (Retry-After, or the reported lag),
+    and otherwise back off exponentially. Subclass this and override classify or wait_time to change either.
+    """
+    AUTH = 'auth'
+    NETWORK = 'network'
+    LAG = 'lag'
+    RATE_LIMIT = 'ratelimit'
+    OTHER = 'other'
+
+    auth_codes = {'assertuserfailed', 'assertbotfailed', 'assertnameduserfailed', 'badtoken', 'notloggedin',
+                  'mwoauth-invalid-authorization'}
+    lag_codes = {'maxlag'}
+    rate_limit_codes = {'ratelimited', 'actionthrottledtext'}
+
+    def __init__(self, max_retries: int = 3, retry_interval: float = 10, max_wait: float = 300):
+        """
+        :param max_retries: How many times to retry before giving up
+        :param retry_interval: Base interval in seconds for exponential backoff, when the server doesn't say how long
+        :param max_wait: Never wait longer than this many seconds before a retry, whatever the server says
+        """
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self.max_wait = max_wait
+
+    def classify(self, error: Optional[BaseException]) -> str:
+        if isinstance(error, AssertUserFailedError):
+            return self.AUTH
+        if isinstance(error, APIError):
+            if error.code in self.auth_codes:
+                return self.AUTH
+            if error.code in self.lag_codes:
+                return self.LAG
+            if error.code in self.rate_limit_codes:
+                return self.RATE_LIMIT
+            return self.OTHER
+        if isinstance(error, HTTPError) and error.response is not None:
+            if error.response.status_code == 429:
+                return self.RATE_LIMIT
+            if error.response.status_code >= 500:
+                return self.NETWORK
+            return self.OTHER
+        if isinstance(error, MaximumRetriesExceeded):
+            # mwclient gives up like this when the wiki keeps telling it that the database is lagged
+            if server_requested_wait().get('lag') is not None:
+                return self.LAG
+            return self.NETWORK
+        if isinstance(error, (Timeout, RequestsConnectionError)):
+            return self.NETWORK
+        return self.OTHER
+
+    def should_relog(self, error: Optional[BaseException]) -> bool:
+        """Whether to throw away the session and log in again before the next retry"""
+        return self.classify(error) == self.AUTH
+
+    def wait_time(self, error: Optional[BaseException], retry: int) -> float:
+        """
+        How many seconds to wait before a retry
+
+        :param error: The error that made the last attempt fail
+        :param retry: How many times we've retried already
+        """
+        error_class = self.classify(error)
+        wait = None
+        if error_class in (self.LAG, self.RATE_LIMIT):
+            wait = self._retry_after(error)
+            if wait is None and error_class == self.LAG:
+                wait = self._lag(error)
+        if wait is None:
+            # don't sleep at all the first retry, and then increment in retry_interval intervals
+            wait = (2 ** retry - 1) * self.retry_interval
+        return min(wait, self.max_wait)
+
+    @staticmethod
+    def _retry_after(error: BaseException) -> Optional[float]:
+        if isinstance(error, HTTPError) and error.response is not None:
+            value = error.response.headers.get('retry-after')
+        else:
+            value = server_requested_wait().get('retry_after')
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        # it can also be an http date
+        try:
+            return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _lag(error: BaseException) -> Optional[float]:
+        lag = server_requested_wait().get('lag')
+        if lag is None and isinstance(error, APIError) and error.info:
+            # e.g. "Waiting for 10.64.16.8: 6 seconds lagged."
+            match = re.search(r'([\d.]+) seconds? lagged', str(error.info))
+            lag = match.group(1) if match else None
+        try:
+            return float(lag) if lag is not None else None
+        except ValueError:
+            return None
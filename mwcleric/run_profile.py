@@ -0,0 +1,117 @@
+import heapq
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class RunProfile(object):
+    """
+    Times each phase of a PageModifier run, in total and for each page. Use it by passing profile=True
+    (or a RunProfile) to a PageModifier; after run() it's available as modifier.profile.
+
+    The phases are:
+
+    * fetch - getting the page's text. Text is fetched for a whole batch of pages at once, so each page in
+      the batch gets an equal share of the time.
+    * prefilter - page_may_change
+    * parse - parsing the text with mwparserfromhell
+    * update_plaintext, update_wikitext (which includes update_template), postprocess
+    * lag - sleeping before saving, or waiting for the rate limit if saving with workers
+    * save
+
+    If saving is done by workers, the lag and save times are included in the totals but not in each page's time,
+    since they overlap with processing the next pages.
+    """
+    phases = ('fetch', 'prefilter', 'parse', 'update_plaintext', 'update_wikitext', 'postprocess', 'lag', 'save')
+
+    def __init__(self, slowest: int = 10):
+        """
+        :param slowest: How many of the slowest pages to keep the times of
+        """
+        self.slowest = slowest
+        self.totals: Dict[str, float] = {phase: 0.0 for phase in self.phases}
+        self.pages = 0
+        self.saved = 0
+        self._slowest_pages: List[tuple] = []
+        self._started: Optional[float] = None
+        self._elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._started = time.perf_counter()
+
+    def finish(self):
+        if self._started is not None:
+            self._elapsed += time.perf_counter() - self._started
+            self._started = None
+
+    @property
+    def elapsed(self) -> float:
+        """Wall time of the run(s) so far in seconds"""
+        if self._started is not None:
+            return self._elapsed + time.perf_counter() - self._started
+        return self._elapsed
+
+    def add_time(self, phase: str, seconds: float):
+        """Adds time to the totals without counting it towards any page"""
+        with self._lock:
+            self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+            if phase == 'save':
+                self.saved += 1
+
+    def add_page(self, title: str, times: Dict[str, float]):
+        """Records the times of a page that's been processed, and adds them to the totals"""
+        total = sum(times.values())
+        with self._lock:
+            self.pages += 1
+            for phase, seconds in times.items():
+                self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+            if 'save' in times:
+                self.saved += 1
+            # a min-heap of the slowest pages, the counter breaks ties without comparing dicts
+            entry = (total, self.pages, title, dict(times))
+            if len(self._slowest_pages) < self.slowest:
+                heapq.heappush(self._slowest_pages, entry)
+            elif self.slowest > 0:
+                heapq.heappushpop(self._slowest_pages, entry)
+
+    def summary(self) -> dict:
+        with self._lock:
+            elapsed = self.elapsed
+            return {
+                'elapsed': elapsed,
+                'pages': self.pages,
+                'saved': self.saved,
+                'pages_per_second': self.pages / elapsed if elapsed > 0 else None,
+                'totals': dict(self.totals),
+                'slowest': [{'title': title, 'total': total, 'phases': times}
+                            for total, _, title, times in sorted(self._slowest_pages, reverse=True)],
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def save(self, path: str):
+        """Saves the summary to a json file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json())
+
+    def report(self) -> str:
+        """A human-readable summary"""
+        summary = self.summary()
+        pages_per_second = summary['pages_per_second']
+        lines = ['{} pages ({} saved) in {:.1f} seconds, {} pages per second'.format(
+            summary['pages'], summary['saved'], summary['elapsed'],
+            '{:.2f}'.format(pages_per_second) if pages_per_second is not None else '-')]
+        timed = sum(summary['totals'].values()) or 1
+        for phase, seconds in summary['totals'].items():
+            lines.append('  {:<17} {:>9.2f} s {:>5.1f}%'.format(phase, seconds, 100 * seconds / timed))
+        if summary['slowest']:
+            lines.append('Slowest pages:')
+            for page in summary['slowest']:
+                if not page['phases']:
+                    continue
+                slowest_phase = max(page['phases'].items(), key=lambda item: item[1])[0]
+                lines.append('  {:>7.3f} s  {} (mostly {})'.format(page['total'], page['title'], slowest_phase))
+        return '\n'.join(lines)
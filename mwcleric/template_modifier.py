@@ -1,6 +1,5 @@
 import re
-from copy import deepcopy
-from typing import Optional, Union
+from typing import Optional, Union, Set, Dict, List
 
 from mwparserfromhell.nodes import Template
 
@@ -15,6 +14,8 @@ class TemplateModifierBase(PageModifierBase):
                  recursive=True,
                  startat_page=None,
                  namespace: Optional[Union[int, str]] = None,
+                 workers: int = 1, edits_per_minute: Optional[float] = None,
+                 follow_redirects: bool = True,
                  **data):
         """
 
@@ -31,33 +32,105 @@ class TemplateModifierBase(PageModifierBase):
         :param recursive: See mwparserfromhell.wikitext.filter_templates method
         :param startat_page: See PageModifier class
         :param namespace: Do we filter the template's used_in list?
+        :param workers: See PageModifier class.
+        :param edits_per_minute: See PageModifier class.
+        :param follow_redirects: Also modify transclusions made through redirects to the template?
         :param data: Extra keywords to save to the class for use in the update_template method
         """
         self.template_name = template
         self.current_template = None
+        self.current_template_name = None
+        self.matched_templates = set()
         self.recursive = recursive
         self.check_deletion_marks = False
-        self.invoke_namespace = None
+        self.site = site
+        self.invoke_namespace = site.ns_name_to_namespace.get('Module', False)
+        self._namespaces_by_name = {name.lower(): ns for name, ns in site.ns_name_to_namespace.items()}
+        self._namespace_names = {ns.id: ns.name for ns in site.namespaces}
+        self.template_titles = self._template_titles(template, follow_redirects)
+        self.template_pattern = self._template_pattern(self.template_titles)
         if title_list is None:
             page_list = page_list if page_list else site.pages_using(template, namespace=namespace)
         super().__init__(site, page_list=page_list, title_list=title_list, limit=limit, summary=summary,
                          quiet=quiet, lag=lag, tags=tags, skip_pages=skip_pages,
-                         startat_page=startat_page, **data)
+                         startat_page=startat_page, workers=workers, edits_per_minute=edits_per_minute, **data)
+
+    def _template_titles(self, templates: Union[str, List[str]], follow_redirects: bool) -> Dict[str, str]:
+        """Returns a dict from every title that we should match to the name of the template it belongs to"""
+        if isinstance(templates, str):
+            templates = [templates]
+        ret = {}
+        for template in templates:
+            for title in self._template_aliases(template, follow_redirects):
+                ret[title] = template
+        return ret
+
+    def _template_aliases(self, template: str, follow_redirects: bool) -> Set[str]:
+        """Returns the normalized titles of a template and, optionally, of all of the redirects to it"""
+        title = self._template_title(template)
+        aliases = {title}
+        if follow_redirects:
+            for redirect in self.site.get_redirects_to(title):
+                aliases.add(self._normalize_title(redirect, 0))
+        return aliases
+
+    def _template_title(self, name: str) -> str:
+        """Returns the normalized title of the page that's transcluded by a template name as written in wikitext"""
+        name = re.sub(r'[\s_]+', ' ', name).strip()
+        # handle Scribunto modules
+        # see https://github.com/earwig/mwparserfromhell/issues/287
+        if name.lower().startswith('#invoke:') and self.invoke_namespace:
+            # replace with localized namespace
+            return self._normalize_title(self.invoke_namespace.name + ':' + name[len('#invoke:'):], 0)
+        if name.startswith(':'):
+            return self._normalize_title(name[1:], 0)
+        return self._normalize_title(name, 10)
+
+    def _normalize_title(self, title: str, default_namespace: int) -> str:
+        if ':' in title:
+            prefix, rest = title.split(':', 1)
+            namespace = self._namespaces_by_name.get(prefix.strip().lower())
+            if namespace is not None:
+                return self._join_title(namespace.id, rest.strip())
+        return self._join_title(default_namespace, title.strip())
+
+    def _join_title(self, namespace: int, title: str) -> str:
+        title = title[:1].upper() + title[1:]
+        if namespace == 0:
+            return title
+        return self._namespace_names[namespace] + ':' + title
+
+    @staticmethod
+    def _template_pattern(names):
+        """
+        A fast check for whether some text might contain any of the given templates. It's allowed to match
+        things that aren't really the template, but it must never miss a transclusion that update_wikitext would find.
+        """
+        alternatives = []
+        for name in names:
+            # only look at the part after the last colon, so that any namespace prefix, #invoke:, subst: etc.
+            # is allowed to come before it
+            title = name.split(':')[-1].strip()
+            alternatives.append(r'[\s_]+'.join(re.escape(word) for word in re.split(r'[\s_]+', title)))
+        # the name itself may contain simple templates or parser functions, which get stripped when matching
+        return re.compile(r'\{\{(?:[^{}|]|\{\{[^{}]*\}\})*?(?:' + '|'.join(alternatives) + ')', re.IGNORECASE)
+
+    def page_may_change(self, text):
+        # if a subclass does its own processing of the page then we can't know what it might change
+        if type(self).update_plaintext is not PageModifierBase.update_plaintext:
+            return True
+        if type(self).update_wikitext is not TemplateModifierBase.update_wikitext:
+            return True
+        return self.template_pattern.search(text) is not None
 
     def update_wikitext(self, wikitext):
+        self.matched_templates = set()
         for template in wikitext.filter_templates(recursive=self.recursive):
-            name = template.name
-            # handle Scribunto modules
-            # see https://github.com/earwig/mwparserfromhell/issues/287
-            if name.startswith('#invoke:'):
-                if self.invoke_namespace is None:
-                    self.invoke_namespace = self.site.ns_name_to_namespace.get('Module', False)
-                if self.invoke_namespace:
-                    name = deepcopy(name)
-                    # replace with localized namespace
-                    name.replace('#invoke:', self.invoke_namespace.name + ':')
-            if name.matches(self.template_name):
+            title = self._template_title(template.name.strip_code())
+            if title in self.template_titles:
                 self.current_template = template
+                self.current_template_name = self.template_titles[title]
+                self.matched_templates.add(self.current_template_name)
                 self.update_template(template)
 
     def update_template(self, template):
@@ -0,0 +1,164 @@
+"""
+Benchmarks of common operations against a FakeWiki, reporting the number of api requests made, wall time and peak
+memory of each. Run with e.g.::
+
+    python -m mwcleric.testing.benchmark --sizes 1000 10000 --latency 0.05
+
+Peak memory is measured with tracemalloc, which slows everything down a little; use --no-memory for more accurate
+times. Since the fake wiki runs in the same process, its responses are included in the peak memory too.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Optional, List, Iterable
+
+from mwcleric.page_modifier import PageModifierBase
+from mwcleric.template_modifier import TemplateModifierBase
+from mwcleric.testing.fake_api import FakeWiki
+from mwcleric.wiki_client import WikiClient
+
+template = 'Infobox'
+cargo_table = 'Infoboxes'
+
+
+class _AppendModifier(PageModifierBase):
+    def update_plaintext(self, text):
+        return text + '\n[[Category:Benchmarked pages]]'
+
+
+class _TemplateModifier(TemplateModifierBase):
+    def update_template(self, tl):
+        tl.add('checked', 'yes')
+
+
+def _get_simple_pages(site: WikiClient, wiki: FakeWiki, size: int):
+    site.get_simple_pages(wiki.titles())
+
+
+def _pages_using(site: WikiClient, wiki: FakeWiki, size: int):
+    for _ in site.pages_using(template):
+        pass
+
+
+def _cargo_query(site: WikiClient, wiki: FakeWiki, size: int):
+    site.cargo_client.query(tables=cargo_table, fields='_pageName=Page, number')
+
+
+def _page_modifier(site: WikiClient, wiki: FakeWiki, size: int):
+    _AppendModifier(site, title_list=wiki.titles(), summary='Benchmark', quiet=True).run()
+
+
+def _template_modifier(site: WikiClient, wiki: FakeWiki, size: int):
+    _TemplateModifier(site, template, summary='Benchmark', quiet=True).run()
+
+
+benchmarks = OrderedDict([
+    ('get_simple_pages', _get_simple_pages),
+    ('pages_using', _pages_using),
+    ('CargoClient.query', _cargo_query),
+    ('PageModifierBase.run', _page_modifier),
+    ('TemplateModifierBase.run', _template_modifier),
+])
+
+
+class BenchmarkResult(object):
+    def __init__(self, name: str, size: int, requests: dict, wall_time: float, peak_memory: Optional[int]):
+        """
+        :param requests: The number of requests made, by action
+        :param peak_memory: Peak memory allocated while running, in bytes, if it was measured
+        """
+        self.name = name
+        self.size = size
+        self.requests = requests
+        self.wall_time = wall_time
+        self.peak_memory = peak_memory
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'size': self.size, 'requests': self.requests, 'wall_time': self.wall_time,
+                'peak_memory': self.peak_memory}
+
+
+def make_wiki(size: int, page_size: int = 2000, latency: float = 0) -> FakeWiki:
+    """A fake wiki with size pages that all use the benchmark template, and a Cargo table with a row for each"""
+    wiki = FakeWiki(latency=latency)
+    titles = wiki.add_pages(size, size=page_size, template=template)
+    wiki.set_page('Template:' + template, '<includeonly>{{{name}}}</includeonly>', log=False)
+    wiki.add_cargo_rows(cargo_table, ({'_pageName': title, 'number': i} for i, title in enumerate(titles)))
+    return wiki
+
+
+def run_benchmark(name: str, size: int, page_size: int = 2000, latency: float = 0,
+                  memory: bool = True) -> BenchmarkResult:
+    """
+    Runs one of the benchmarks against a new fake wiki. Setting up the wiki and logging in aren't included.
+
+    :param name: A key of benchmarks
+    :param size: How many pages the wiki has
+    :param page_size: Size of each page in bytes
+    :param latency: Seconds that each request takes
+    :param memory: Measure peak memory with tracemalloc?
+    """
+    wiki = make_wiki(size, page_size=page_size)
+    site = wiki.client(credentials=wiki.credentials(), cargo=True, retry_interval=0)
+    wiki.latency = latency
+    wiki.reset_counts()
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        benchmarks[name](site, wiki, size)
+        wall_time = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return BenchmarkResult(name, size, dict(wiki.requests), wall_time, peak_memory)
+
+
+def run_benchmarks(names: Optional[Iterable[str]] = None, sizes: Iterable[int] = (1000, 10000, 100000),
+                   **kwargs) -> List[BenchmarkResult]:
+    """Runs each benchmark at each size, kwargs are passed to run_benchmark"""
+    return [run_benchmark(name, size, **kwargs) for name in (names or benchmarks) for size in sizes]
+
+
+def report(results: List[BenchmarkResult]) -> str:
+    lines = ['{:<26} {:>8} {:>9} {:>10} {:>12}'.format('benchmark', 'pages', 'requests', 'seconds', 'peak MB')]
+    for result in results:
+        lines.append('{:<26} {:>8} {:>9} {:>10.2f} {:>12}'.format(
+            result.name, result.size, result.request_count, result.wall_time,
+            '{:.1f}'.format(result.peak_memory / 1024 / 1024) if result.peak_memory is not None else '-'))
+    return '\n'.join(lines)
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Benchmark mwcleric against a fake wiki')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(benchmarks), default=list(benchmarks))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000],
+                        help='Numbers of pages to run each benchmark with')
+    parser.add_argument('--page-size', type=int, default=2000, help='Size of each page in bytes')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds that each request takes')
+    parser.add_argument('--no-memory', action='store_true', help="Don't measure peak memory")
+    parser.add_argument('--json', help='Also save the results to this file')
+    options = parser.parse_args(args)
+    results = []
+    # print each result as soon as it's ready, since the larger sizes can take a while
+    print(report(results), flush=True)
+    for name in options.benchmarks:
+        for size in options.sizes:
+            result = run_benchmark(name, size, page_size=options.page_size, latency=options.latency,
+                                   memory=not options.no_memory)
+            print(report([result]).splitlines()[-1], flush=True)
+            results.append(result)
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as f:
+            json.dump([result.to_dict() for result in results], f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
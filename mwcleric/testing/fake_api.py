@@ -0,0 +1,760 @@
+import itertools
+import json
+import operator
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Iterable
+from urllib.parse import parse_qsl, urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from mwcleric.auth_credentials import AuthCredentials
+from mwcleric.clients.site import Site
+
+
+class FakeWiki(object):
+    """
+    An in-memory stand-in for a MediaWiki api (with Cargo), for testing and benchmarking scripts without a real wiki.
+    Nothing goes over the network: client() and site() return a WikiClient or Site whose requests are answered by
+    this object through a FakeAdapter mounted on their session.
+
+    Supported:
+
+    * action=query with titles (prop=info|revisions, redirects, normalized titles, continuation when the revisions
+      don't fit in max_result_size), list=embeddedin and generator=embeddedin, list=backlinks (redirects only),
+      list=recentchanges, list=logevents, meta=siteinfo|userinfo|tokens|allmessages
+    * action=edit, purge, patrol, login and cargoquery
+
+    Cargo tables are lists of dicts in self.cargo, queried with a small subset of SQL: plain fields with optional
+    aliases, MIN/MAX/COUNT, where clauses joined with AND, order_by, limit and offset.
+
+    Every request is counted in self.requests (by action) and self.request_count. Set latency to make every
+    request take that many seconds, e.g. to see how a script behaves against a slow wiki.
+
+    Example::
+
+        wiki = FakeWiki()
+        wiki.add_pages(1000, size=2000, template='Infobox')
+        site = wiki.client(credentials=wiki.credentials())
+        pages = site.get_simple_pages(wiki.titles())
+        print(wiki.request_count)
+    """
+    generator = 'MediaWiki 1.39.0'
+    namespaces = {
+        -2: ('Media', 'Media'), -1: ('Special', 'Special'), 0: ('', None), 1: ('Talk', 'Talk'),
+        2: ('User', 'User'), 3: ('User talk', 'User talk'), 4: ('Project', 'Project'),
+        5: ('Project talk', 'Project talk'), 6: ('File', 'File'), 7: ('File talk', 'File talk'),
+        8: ('MediaWiki', 'MediaWiki'), 9: ('MediaWiki talk', 'MediaWiki talk'), 10: ('Template', 'Template'),
+        11: ('Template talk', 'Template talk'), 14: ('Category', 'Category'), 15: ('Category talk', 'Category talk'),
+        828: ('Module', 'Module'), 829: ('Module talk', 'Module talk'),
+    }
+    namespace_aliases = {'Image': 6, 'Image talk': 7}
+    user_rights = ('read', 'edit', 'createpage', 'purge', 'patrol', 'autopatrol', 'move', 'delete', 'protect',
+                   'bot', 'apihighlimits', 'noratelimit')
+    anon_rights = ('read', 'edit', 'createpage')
+    tokens = {'csrf': '2f3a+\\', 'patrol': '2f3a+\\', 'login': '7b1c+\\'}
+    # the most results a module returns per request, with and without apihighlimits
+    limit = 500
+    high_limit = 5000
+    # the default value of $wgAPIMaxResultSize
+    max_result_size = 8 * 1024 * 1024
+    cargo_limit = 500
+    _counter = itertools.count(1)
+
+    def __init__(self, host: Optional[str] = None, latency: float = 0, users: Optional[Dict[str, str]] = None,
+                 extensions: Iterable[str] = ('Cargo', 'Scribunto', 'ParserFunctions')):
+        """
+        :param host: The wiki's host name. Defaults to a unique name, so that clients of different fake wikis
+            are never mixed up by the session manager.
+        :param latency: Seconds that every request takes
+        :param users: Optional - usernames and passwords that can log in. By default any login succeeds.
+        :param extensions: Names of the extensions reported by siteinfo
+        """
+        self.host = host or 'fake-wiki-{}.test'.format(next(self._counter))
+        self.latency = latency
+        self.users = users
+        self.extensions = list(extensions)
+        self.user: Optional[str] = None
+        self.pages: Dict[str, dict] = {}
+        self.cargo: Dict[str, List[dict]] = {}
+        self.messages: Dict[str, Dict[str, str]] = {'en': {'mainpage': 'Main Page'}}
+        self.recent_changes: List[dict] = []
+        self.logs: List[dict] = []
+        self.edits: List[tuple] = []
+        self.purges: List[str] = []
+        self.patrols: List[int] = []
+        self.requests = Counter()
+        self.request_count = 0
+        # set these to make the next write requests fail, e.g. to test retries
+        self.fail_writes = 0
+        self.lagged_writes = 0
+        self._transclusions: Dict[str, Dict[int, None]] = {}
+        self._pages_by_id: Dict[int, dict] = {}
+        self._next_id = 1
+        self._next_revid = 1
+        self._clock = datetime(2024, 1, 1)
+        self._namespace_names = {}
+        for ns, (name, canonical) in self.namespaces.items():
+            self._namespace_names[name.lower()] = ns
+            if canonical:
+                self._namespace_names[canonical.lower()] = ns
+        for alias, ns in self.namespace_aliases.items():
+            self._namespace_names[alias.lower()] = ns
+        self._lock = threading.RLock()
+
+    # Setting up the wiki
+
+    def set_page(self, title: str, text: str, summary: str = '', log: bool = True) -> dict:
+        """
+        Creates or edits a page
+
+        :param log: Also add the change to recent changes
+        :return: The page's data
+        """
+        with self._lock:
+            title = self.normalize(title)
+            page = self.pages.get(title)
+            created = page is None
+            if created:
+                page = {'pageid': self._next_id, 'ns': self.namespace_of(title), 'title': title}
+                self._next_id += 1
+                self.pages[title] = page
+                self._pages_by_id[page['pageid']] = page
+            else:
+                self._remove_transclusions(page)
+            timestamp = self._tick()
+            match = re.match(r'\s*#redirect\s*:?\s*\[\[([^\]|#]+)', text, re.IGNORECASE)
+            page.update(text=text, revid=self._next_revid, timestamp=timestamp,
+                        redirect=self.normalize(match.group(1)) if match else None)
+            self._next_revid += 1
+            self._add_transclusions(page)
+            if log:
+                self.recent_changes.append({
+                    'type': 'new' if created else 'edit', 'ns': page['ns'], 'title': title,
+                    'pageid': page['pageid'], 'revid': page['revid'], 'rcid': len(self.recent_changes) + 1,
+                    'timestamp': timestamp, 'comment': summary, 'user': self.user or '127.0.0.1',
+                })
+            return page
+
+    def add_pages(self, count: int, size: int = 2000, template: Optional[str] = 'Infobox', template_every: int = 1,
+                  prefix: str = 'Page') -> List[str]:
+        """
+        Creates pages named "<prefix> 1", "<prefix> 2", etc, without adding them to recent changes
+
+        :param count: How many pages to create
+        :param size: Roughly how many bytes of text each page has
+        :param template: Optional - a template that pages use, with a name and a number parameter
+        :param template_every: Only every this many pages use the template
+        :return: The titles of the new pages
+        """
+        filler = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. '
+        titles = []
+        for i in range(1, count + 1):
+            title = '{} {}'.format(prefix, i)
+            text = ''
+            if template is not None and i % template_every == 0:
+                text = '{{%s\n|name=%s\n|number=%d\n}}\n' % (template, title, i)
+            if len(text) < size:
+                text += (filler * (size // len(filler) + 1))[:size - len(text)]
+            self.set_page(title, text, log=False)
+            titles.append(title)
+        return titles
+
+    def add_cargo_rows(self, table: str, rows: Iterable[dict]):
+        """Adds rows to a Cargo table, giving each an _ID"""
+        with self._lock:
+            existing = self.cargo.setdefault(table, [])
+            for row in rows:
+                row = dict(row)
+                row.setdefault('_ID', len(existing) + 1)
+                row.setdefault('_pageName', '')
+                existing.append(row)
+
+    def add_log(self, log_type: str, title: str, action: Optional[str] = None,
+                params: Optional[dict] = None) -> dict:
+        with self._lock:
+            title = self.normalize(title)
+            page = self.pages.get(title)
+            log = {
+                'logid': len(self.logs) + 1, 'type': log_type, 'action': action or log_type,
+                'ns': self.namespace_of(title), 'title': title, 'pageid': page['pageid'] if page else 0,
+                'timestamp': self._tick(), 'user': self.user or '127.0.0.1', 'comment': '', 'params': params or {},
+            }
+            self.logs.append(log)
+            return log
+
+    def titles(self, namespace: Optional[int] = None) -> List[str]:
+        """The titles of all existing pages, in the order they were created"""
+        return [title for title, page in self.pages.items() if namespace is None or page['ns'] == namespace]
+
+    def text(self, title: str) -> Optional[str]:
+        page = self.pages.get(self.normalize(title))
+        return page['text'] if page is not None else None
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests = Counter()
+            self.request_count = 0
+
+    # Connecting to the wiki
+
+    def session(self) -> requests.Session:
+        """A requests session whose requests to this wiki are answered by this object"""
+        session = requests.Session()
+        session.mount('https://{}'.format(self.host), FakeAdapter(self))
+        return session
+
+    def site(self, **kwargs) -> Site:
+        """A Site for the wiki, kwargs are passed to Site"""
+        return Site(self.host, path='/', pool=self.session(), **kwargs)
+
+    def client(self, client_class=None, **kwargs):
+        """
+        A WikiClient (or other client class that takes the same arguments) for the wiki
+
+        :param client_class: Optional - defaults to WikiClient
+        :param kwargs: Passed to the client, e.g. credentials
+        """
+        if client_class is None:
+            from mwcleric.wiki_client import WikiClient
+            client_class = WikiClient
+        return client_class(self.host, path='/', pool=self.session(), **kwargs)
+
+    def credentials(self) -> AuthCredentials:
+        """Credentials that can log in to the wiki"""
+        if self.users:
+            username, password = next(iter(self.users.items()))
+            return AuthCredentials(username=username, password=password)
+        return AuthCredentials(username='FakeBot@bot', password='password')
+
+    # Titles
+
+    def normalize(self, title: str) -> str:
+        title = re.sub(r'[\s_]+', ' ', title).strip()
+        if title.startswith(':'):
+            title = title[1:].strip()
+        ns = 0
+        if ':' in title:
+            prefix, rest = title.split(':', 1)
+            prefix_ns = self._namespace_names.get(prefix.strip().lower())
+            if prefix_ns is not None:
+                ns, title = prefix_ns, rest.strip()
+        title = title[:1].upper() + title[1:]
+        if ns == 0:
+            return title
+        return '{}:{}'.format(self.namespaces[ns][0], title)
+
+    def namespace_of(self, title: str) -> int:
+        if ':' not in title:
+            return 0
+        return self._namespace_names.get(title.split(':', 1)[0].lower(), 0)
+
+    @staticmethod
+    def is_valid(title: str) -> bool:
+        return title.strip(' _:') != '' and re.search(r'[#<>\[\]|{}]', title) is None
+
+    def redirect_target(self, title: str) -> Optional[str]:
+        page = self.pages.get(title)
+        return page['redirect'] if page is not None else None
+
+    # Handling requests
+
+    def handle(self, params: Dict[str, str]) -> dict:
+        """Answers a single api request, given its parameters"""
+        with self._lock:
+            action = params.get('action')
+            self.requests[action] += 1
+            self.request_count += 1
+            handler = getattr(self, '_' + str(action), None)
+            if handler is None or action not in self.actions:
+                return self._error('badvalue', 'Unrecognized value for parameter "action": {}.'.format(action))
+            if action in self.write_actions:
+                if params.get('assert') == 'user' and self.user is None:
+                    return self._error('assertuserfailed', 'You are no longer logged in.')
+                if self.fail_writes > 0:
+                    self.fail_writes -= 1
+                    return self._error('ratelimited', "As an anti-abuse measure, you are limited from performing "
+                                                      "this action too many times in a short space of time.")
+            try:
+                return handler(params)
+            except _ApiError as e:
+                return self._error(e.code, e.info)
+
+    actions = {'query', 'edit', 'purge', 'patrol', 'login', 'logout', 'cargoquery'}
+    write_actions = {'edit', 'purge', 'patrol'}
+
+    @staticmethod
+    def _error(code: str, info: str) -> dict:
+        return {'error': {'code': code, 'info': info}}
+
+    def _check_token(self, params: dict, token_type: str):
+        if params.get('token') != self.tokens[token_type]:
+            raise _ApiError('badtoken', 'Invalid CSRF token.')
+
+    def _tick(self) -> str:
+        self._clock += timedelta(seconds=1)
+        return self._clock.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def _rights(self):
+        return list(self.user_rights if self.user is not None else self.anon_rights)
+
+    def _max_limit(self) -> int:
+        return self.high_limit if 'apihighlimits' in self._rights() else self.limit
+
+    def _limit(self, value: Optional[str], default: int = 10) -> int:
+        if value is None:
+            return default
+        if value == 'max':
+            return self._max_limit()
+        return min(int(value), self._max_limit())
+
+    def _login(self, params: dict) -> dict:
+        if params.get('lgtoken') != self.tokens['login']:
+            return {'login': {'result': 'NeedToken', 'token': self.tokens['login']}}
+        username = params.get('lgname', '')
+        if self.users is not None and self.users.get(username) != params.get('lgpassword'):
+            return {'login': {'result': 'Failed', 'reason': 'Incorrect username or password entered.'}}
+        # with bot passwords, the user is the part before the @
+        self.user = username.split('@')[0]
+        return {'login': {'result': 'Success', 'lguserid': 1, 'lgusername': self.user}}
+
+    def _logout(self, params: dict) -> dict:
+        self.user = None
+        return {}
+
+    def _edit(self, params: dict) -> dict:
+        self._check_token(params, 'csrf')
+        title = self.normalize(params['title'])
+        if not self.is_valid(title):
+            raise _ApiError('invalidtitle', 'Bad title "{}".'.format(params['title']))
+        page = self.pages.get(title)
+        if page is None and 'nocreate' in params:
+            raise _ApiError('missingtitle', "The page you specified doesn't exist.")
+        if page is not None and 'createonly' in params:
+            raise _ApiError('articleexists', 'The article you tried to create has been created already.')
+        old_text = page['text'] if page is not None else ''
+        if 'text' in params:
+            text = params['text']
+        else:
+            text = params.get('prependtext', '') + old_text + params.get('appendtext', '')
+        if page is not None and text.rstrip() == old_text.rstrip():
+            return {'edit': {'result': 'Success', 'pageid': page['pageid'], 'title': title,
+                             'contentmodel': 'wikitext', 'nochange': ''}}
+        old_revid = page['revid'] if page is not None else 0
+        page = self.set_page(title, text, summary=params.get('summary', ''))
+        self.edits.append((title, params.get('summary', '')))
+        ret = {'result': 'Success', 'pageid': page['pageid'], 'title': title, 'contentmodel': 'wikitext',
+               'oldrevid': old_revid, 'newrevid': page['revid'], 'newtimestamp': page['timestamp']}
+        if old_revid == 0:
+            ret['new'] = ''
+        return {'edit': ret}
+
+    def _purge(self, params: dict) -> dict:
+        result = []
+        normalized = []
+        for title in params['titles'].split('|'):
+            name = self.normalize(title)
+            if name != title:
+                normalized.append({'from': title, 'to': name})
+            if not self.is_valid(name):
+                result.append({'title': title, 'invalid': '', 'invalidreason': 'Bad title'})
+                continue
+            self.purges.append(name)
+            row = {'ns': self.namespace_of(name), 'title': name}
+            row['purged' if name in self.pages else 'missing'] = ''
+            if 'forcelinkupdate' in params or 'forcerecursivelinkupdate' in params:
+                row['linkupdate'] = ''
+            result.append(row)
+        ret = {'batchcomplete': '', 'purge': result}
+        if normalized:
+            ret['normalized'] = normalized
+        return ret
+
+    def _patrol(self, params: dict) -> dict:
+        self._check_token(params, 'patrol')
+        if 'rcid' in params:
+            rcid = int(params['rcid'])
+            change = self.recent_changes[rcid - 1] if 0 < rcid <= len(self.recent_changes) else None
+        else:
+            revid = int(params.get('revid', 0))
+            change = next((rc for rc in self.recent_changes if rc['revid'] == revid), None)
+        if change is None:
+            raise _ApiError('nosuchrcid', 'There is no recent change with that ID.')
+        self.patrols.append(change['rcid'])
+        change['patrolled'] = ''
+        return {'patrol': {'rcid': change['rcid'], 'ns': change['ns'], 'title': change['title']}}
+
+    def _query(self, params: dict) -> dict:
+        query = {}
+        ret = {'batchcomplete': '', 'query': query}
+        meta = params.get('meta', '').split('|')
+        if 'siteinfo' in meta:
+            self._siteinfo(params, query)
+        if 'userinfo' in meta:
+            if self.user is None:
+                query['userinfo'] = {'id': 0, 'name': '127.0.0.1', 'anon': ''}
+            else:
+                query['userinfo'] = {'id': 1, 'name': self.user}
+            query['userinfo']['rights'] = self._rights()
+            query['userinfo']['groups'] = ['*'] if self.user is None else ['*', 'user', 'bot']
+        if 'tokens' in meta:
+            query['tokens'] = {'{}token'.format(token_type): self.tokens.get(token_type, self.tokens['csrf'])
+                               for token_type in params.get('type', 'csrf').split('|')}
+        if 'allmessages' in meta:
+            self._allmessages(params, query)
+        titles = None
+        if 'titles' in params:
+            titles = params['titles'].split('|')
+        elif 'pageids' in params:
+            titles = [self._pages_by_id[int(pageid)]['title'] for pageid in params['pageids'].split('|')
+                      if int(pageid) in self._pages_by_id]
+        lists = params.get('list', '').split('|')
+        generator = params.get('generator')
+        if 'embeddedin' in lists or generator == 'embeddedin':
+            rows, cont = self._embeddedin('gei' if generator == 'embeddedin' else 'ei', params)
+            if generator == 'embeddedin':
+                titles = [row['title'] for row in rows]
+            else:
+                query['embeddedin'] = rows
+            self._continue(ret, cont)
+        if 'backlinks' in lists:
+            target = self.normalize(params['bltitle'])
+            query['backlinks'] = [{'pageid': page['pageid'], 'ns': page['ns'], 'title': title, 'redirect': ''}
+                                  for title, page in self.pages.items() if page['redirect'] == target]
+        if 'recentchanges' in lists:
+            query['recentchanges'], cont = self._changes('rc', self.recent_changes, 'rcid', params)
+            self._continue(ret, cont)
+        if 'logevents' in lists:
+            query['logevents'], cont = self._changes('le', self.logs, 'logid', params)
+            self._continue(ret, cont)
+        if titles is not None:
+            self._titles(titles, params, ret)
+        if 'continue' in ret:
+            del ret['batchcomplete']
+        return ret
+
+    @staticmethod
+    def _continue(ret: dict, cont: Optional[dict]):
+        if cont:
+            ret.setdefault('continue', {'continue': '-||'}).update(cont)
+
+    def _siteinfo(self, params: dict, query: dict):
+        prop = params.get('siprop', 'general').split('|')
+        if 'general' in prop:
+            query['general'] = {'mainpage': 'Main Page', 'sitename': 'Fake Wiki', 'generator': self.generator,
+                                'lang': 'en', 'server': 'https://' + self.host, 'scriptpath': '',
+                                'articlepath': '/$1', 'case': 'first-letter'}
+        if 'namespaces' in prop:
+            query['namespaces'] = {}
+            for ns, (name, canonical) in self.namespaces.items():
+                row = {'id': ns, 'case': 'first-letter', '*': name}
+                if canonical is not None:
+                    row['canonical'] = canonical
+                query['namespaces'][str(ns)] = row
+        if 'namespacealiases' in prop:
+            query['namespacealiases'] = [{'id': ns, '*': alias} for alias, ns in self.namespace_aliases.items()]
+        if 'extensions' in prop:
+            query['extensions'] = [{'type': 'other', 'name': name} for name in self.extensions]
+
+    def _allmessages(self, params: dict, query: dict):
+        messages = self.messages.get(params.get('amlang') or params.get('uselang') or 'en', {})
+        result = []
+        for key in params.get('ammessages', '').split('|'):
+            if key in messages:
+                result.append({'name': key, 'normalizedname': key, '*': messages[key]})
+            else:
+                result.append({'name': key, 'normalizedname': key, 'missing': ''})
+        query['allmessages'] = result
+
+    def _titles(self, titles: List[str], params: dict, ret: dict):
+        query = ret['query']
+        props = params.get('prop', '').split('|')
+        rvprop = params.get('rvprop', 'ids|timestamp|flags|comment|user').split('|')
+        start = int(params.get('rvcontinue', '0').split('|')[0])
+        size = 0
+        pages = {}
+        normalized = []
+        redirects = []
+        missing_id = -1
+        resolved = []
+        for title in dict.fromkeys(titles):
+            name = self.normalize(title)
+            if name != title:
+                normalized.append({'from': title, 'to': name})
+            if not self.is_valid(name):
+                pages[str(missing_id)] = {'title': title, 'invalidreason': 'Bad title', 'invalid': ''}
+                missing_id -= 1
+                continue
+            if 'redirects' in params:
+                seen = set()
+                target = self.redirect_target(name)
+                while target is not None and name not in seen:
+                    seen.add(name)
+                    redirects.append({'from': name, 'to': target})
+                    name = target
+                    target = self.redirect_target(name)
+            resolved.append(name)
+        # like the real api, pages are returned in order of page id
+        for name in sorted(dict.fromkeys(resolved), key=lambda t: self.pages[t]['pageid'] if t in self.pages else 0):
+            page = self.pages.get(name)
+            if page is None:
+                pages[str(missing_id)] = {'ns': self.namespace_of(name), 'title': name, 'missing': ''}
+                missing_id -= 1
+                continue
+            row = {'pageid': page['pageid'], 'ns': page['ns'], 'title': name}
+            if 'info' in props:
+                row.update(contentmodel='wikitext', pagelanguage='en', touched=page['timestamp'],
+                           lastrevid=page['revid'], length=len(page['text'].encode('utf-8')))
+                if page['redirect'] is not None:
+                    row['redirect'] = ''
+                if 'protection' in params.get('inprop', ''):
+                    row['protection'] = []
+            if 'revisions' in props and page['pageid'] >= start and 'continue' not in ret:
+                revision = {}
+                if 'ids' in rvprop:
+                    revision.update(revid=page['revid'], parentid=0)
+                if 'timestamp' in rvprop:
+                    revision['timestamp'] = page['timestamp']
+                if 'content' in rvprop:
+                    size += len(page['text'].encode('utf-8'))
+                    if size > self.max_result_size and len(pages) > 0:
+                        self._continue(ret, {'rvcontinue': '{}|{}'.format(page['pageid'], page['revid'])})
+                        pages[str(page['pageid'])] = row
+                        continue
+                    content = {'contentmodel': 'wikitext', 'contentformat': 'text/x-wiki', '*': page['text']}
+                    if 'rvslots' in params:
+                        revision['slots'] = {'main': content}
+                    else:
+                        revision.update(content)
+                row['revisions'] = [revision]
+            pages[str(page['pageid'])] = row
+        query['pages'] = pages
+        if normalized:
+            query['normalized'] = normalized
+        if redirects:
+            query['redirects'] = redirects
+
+    def _template_title(self, name: str) -> str:
+        name = re.sub(r'[\s_]+', ' ', name).strip()
+        if name.lower().startswith('#invoke:'):
+            return self.normalize('Module:' + name[len('#invoke:'):])
+        if name.startswith(':') or self.namespace_of(name) != 0:
+            return self.normalize(name)
+        return self.normalize('Template:' + name)
+
+    def _add_transclusions(self, page: dict):
+        page['templates'] = set()
+        for name in re.findall(r'\{\{\s*([^{}|\n]+?)\s*(?:\||\}\})', page['text']):
+            if not self.is_valid(name.split('#invoke:')[-1]):
+                continue
+            title = self._template_title(name)
+            page['templates'].add(title)
+            self._transclusions.setdefault(title, {})[page['pageid']] = None
+
+    def _remove_transclusions(self, page: dict):
+        for title in page.get('templates', ()):
+            self._transclusions.get(title, {}).pop(page['pageid'], None)
+
+    def _embeddedin(self, prefix: str, params: dict):
+        target = self.normalize(params[prefix + 'title'])
+        # pages that use a redirect to the template also use the template itself
+        sources = [target] + [title for title, page in self.pages.items() if page['redirect'] == target]
+        pageids = set()
+        for source in sources:
+            pageids.update(self._transclusions.get(source, {}))
+        start = int(params.get(prefix + 'continue', '0|0').split('|')[-1])
+        namespaces = params.get(prefix + 'namespace')
+        namespaces = {int(ns) for ns in namespaces.split('|')} if namespaces else None
+        filterredir = params.get(prefix + 'filterredir', 'all')
+        limit = self._limit(params.get(prefix + 'limit'))
+        rows = []
+        for pageid in sorted(pageids):
+            if pageid < start:
+                continue
+            page = self._pages_by_id[pageid]
+            if namespaces is not None and page['ns'] not in namespaces:
+                continue
+            is_redirect = page['redirect'] is not None
+            if filterredir == 'redirects' and not is_redirect or filterredir == 'nonredirects' and is_redirect:
+                continue
+            if len(rows) == limit:
+                return rows, {prefix + 'continue': '{}|{}'.format(page['ns'], pageid)}
+            rows.append({'pageid': pageid, 'ns': page['ns'], 'title': page['title']})
+        return rows, None
+
+    def _changes(self, prefix: str, changes: List[dict], id_key: str, params: dict):
+        newer = params.get(prefix + 'dir', 'older') == 'newer'
+        start = params.get(prefix + 'start')
+        end = params.get(prefix + 'end')
+        namespaces = params.get(prefix + 'namespace')
+        namespaces = {int(ns) for ns in str(namespaces).split('|')} if namespaces is not None else None
+        types = params.get(prefix + 'type')
+        types = set(types.split('|')) if types else None
+        cont = params.get(prefix + 'continue')
+        limit = self._limit(params.get(prefix + 'limit'))
+        if cont is not None:
+            cont_timestamp, cont_id = cont.rsplit('|', 1)
+            cont = (cont_timestamp, int(cont_id))
+        rows = []
+        for change in (changes if newer else reversed(changes)):
+            timestamp = change['timestamp']
+            if start is not None and (timestamp < start if newer else timestamp > start):
+                continue
+            if end is not None and (timestamp > end if newer else timestamp < end):
+                continue
+            key = (timestamp, change[id_key])
+            if cont is not None and (key < cont if newer else key > cont):
+                continue
+            if namespaces is not None and change['ns'] not in namespaces:
+                continue
+            if types is not None and change['type'] not in types:
+                continue
+            if len(rows) == limit:
+                return rows, {prefix + 'continue': '{}|{}'.format(timestamp, change[id_key])}
+            rows.append(dict(change))
+        return rows, None
+
+    def _cargoquery(self, params: dict) -> dict:
+        if ',' in params['tables'] or 'join_on' in params:
+            raise _ApiError('MWException', 'Joins are not supported by FakeWiki')
+        # fields may be prefixed with the table's alias, which we ignore anyway
+        table = params['tables'].split('=')[0].strip()
+        if table not in self.cargo:
+            raise _ApiError('MWException', 'Error: No database table exists named "{}".'.format(table))
+        conditions = _cargo_where(params.get('where'))
+        rows = [row for row in self.cargo[table] if _cargo_matches(row, conditions)]
+        fields = [_cargo_field(field) for field in params.get('fields', '_pageName').split(',')]
+        if any(function is not None for _, function, _ in fields):
+            result = [{alias: _cargo_aggregate(function, name, rows) for name, function, alias in fields}]
+        else:
+            if params.get('order_by'):
+                for clause in reversed(params['order_by'].split(',')):
+                    words = clause.split()
+                    name = words[0].split('.')[-1]
+                    descending = len(words) > 1 and words[1].upper() == 'DESC'
+                    rows = sorted(rows, key=lambda row: _cargo_sort_key(row.get(name)), reverse=descending)
+            offset = int(params.get('offset', 0))
+            limit = params.get('limit', 50)
+            limit = self.cargo_limit if limit == 'max' else min(int(limit), self.cargo_limit)
+            result = [{alias: _cargo_value(row.get(name)) for name, _, alias in fields}
+                      for row in rows[offset:offset + limit]]
+        return {'limits': {'cargoquery': self.cargo_limit}, 'cargoquery': [{'title': row} for row in result]}
+
+
+class _ApiError(Exception):
+    def __init__(self, code: str, info: str):
+        super().__init__(code, info)
+        self.code = code
+        self.info = info
+
+
+_cargo_operators = {'=': operator.eq, '!=': operator.ne, '<>': operator.ne, '<': operator.lt, '>': operator.gt,
+                    '<=': operator.le, '>=': operator.ge}
+
+
+def _cargo_field(field: str):
+    """Returns the column, aggregate function (if any) and output name of an entry in fields"""
+    field = field.strip()
+    expression, alias = field.split('=', 1) if '=' in field else (field, None)
+    expression = expression.strip()
+    match = re.match(r'(MIN|MAX|COUNT)\s*\(\s*(.*?)\s*\)$', expression, re.IGNORECASE)
+    function = None
+    if match:
+        function, expression = match.group(1).upper(), match.group(2)
+    name = expression.split('.')[-1]
+    return name, function, (alias.strip() if alias else expression if function is None else field)
+
+
+def _cargo_aggregate(function: str, name: str, rows: List[dict]):
+    if function == 'COUNT':
+        return str(len(rows) if name == '*' else sum(1 for row in rows if row.get(name) is not None))
+    values = [row[name] for row in rows if row.get(name) is not None]
+    if len(values) == 0:
+        return None
+    return _cargo_value((min if function == 'MIN' else max)(values, key=_cargo_sort_key))
+
+
+def _cargo_where(where: Optional[str]) -> List[tuple]:
+    """Parses a where clause into a list of (column, operator, value) conditions that must all be true"""
+    conditions = []
+    for clause in re.split(r'\s+AND\s+', (where or '').strip(), flags=re.IGNORECASE):
+        # with only AND supported, parentheses don't change anything
+        clause = clause.strip('() ')
+        if clause == '':
+            continue
+        match = re.match(r'([\w.]+)\s*(<=|>=|!=|<>|=|<|>)\s*(.+)$', clause)
+        if match is None:
+            raise _ApiError('MWException', 'FakeWiki cannot evaluate the where clause "{}"'.format(clause))
+        value = match.group(3).strip()
+        if value[:1] in ('"', "'"):
+            value = value[1:-1]
+        conditions.append((match.group(1).split('.')[-1], _cargo_operators[match.group(2)], _cargo_sort_key(value)))
+    return conditions
+
+
+def _cargo_matches(row: dict, conditions: List[tuple]) -> bool:
+    for name, op, value in conditions:
+        actual = row.get(name)
+        if actual is None or not op(_cargo_sort_key(actual), value):
+            return False
+    return True
+
+
+def _cargo_sort_key(value):
+    """Numbers sort as numbers and before everything else, like in SQL when comparing a number column"""
+    if value is None:
+        return 0, 0, ''
+    try:
+        return 1, float(value), ''
+    except (TypeError, ValueError):
+        return 2, 0, str(value)
+
+
+def _cargo_value(value) -> Optional[str]:
+    # Cargo returns every value as a string
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+class FakeAdapter(BaseAdapter):
+    """A transport adapter for requests that sends every api request to a FakeWiki instead of the network"""
+
+    def __init__(self, wiki: FakeWiki):
+        super().__init__()
+        self.wiki = wiki
+
+    def send(self, request, **kwargs):
+        if self.wiki.latency:
+            time.sleep(self.wiki.latency)
+        params = dict(parse_qsl(urlparse(request.url).query, keep_blank_values=True))
+        if request.body:
+            body = request.body if isinstance(request.body, str) else request.body.decode('utf-8')
+            params.update(parse_qsl(body, keep_blank_values=True))
+        headers = CaseInsensitiveDict({'Content-Type': 'application/json; charset=utf-8'})
+        if params.get('action') in self.wiki.write_actions and 'maxlag' in params and self.wiki.lagged_writes > 0:
+            with self.wiki._lock:
+                self.wiki.lagged_writes -= 1
+                self.wiki.requests[params['action']] += 1
+                self.wiki.request_count += 1
+            headers.update({'X-Database-Lag': '5', 'Retry-After': '5'})
+            result = FakeWiki._error('maxlag', 'Waiting for a database server: 5 seconds lagged.')
+        else:
+            result = self.wiki.handle(params)
+        response = Response()
+        response.status_code = 200
+        response.headers = headers
+        response._content = json.dumps(result).encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
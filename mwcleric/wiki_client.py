@@ -1,24 +1,55 @@
+import queue
+import sys
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import time
 import calendar
-from typing import Optional, Union, List, Dict, Generator
+from typing import Optional, Union, List, Dict, Generator, Iterable, Iterator
 
+from mwcleric.change_feed import ChangeFeed
 from mwcleric.clients.cargo_client import CargoClient
+from mwcleric.clients.instrumentation import Instrumentation
+from mwcleric.clients.response_cache import ResponseCache
 from mwclient.errors import APIError, MaximumRetriesExceeded
 from mwclient.errors import AssertUserFailedError
 from mwclient.page import Page
-from requests.exceptions import ReadTimeout
+from mwclient.util import parse_timestamp
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ReadTimeout, HTTPError, ConnectionError as RequestsConnectionError
 
 from mwcleric.clients.session_manager import session_manager
 from mwcleric.clients.site import Site
+from mwcleric.clients.siteinfo_cache import SiteinfoCache
 from mwcleric.models.namespace import Namespace
 from mwcleric.models.simple_page import SimplePage
 from .auth_credentials import AuthCredentials
+from .rate_limiter import RateLimiter
+from .retry_policy import RetryPolicy
 from .errors import PatrolRevisionInvalid, InvalidNamespaceName
 from .errors import PatrolRevisionNotSpecified
 from .errors import RetriedLoginAndStillFailed
 
 
+class _PageIdSet(object):
+    """A set of page ids stored as a bitmap, which takes far less memory than a set of ints for large results"""
+
+    def __init__(self):
+        self._bits = bytearray()
+
+    def add(self, pageid: int) -> bool:
+        """Adds the page id and returns True if it wasn't already in the set"""
+        byte, bit = divmod(pageid, 8)
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(max(byte + 1 - len(self._bits), len(self._bits))))
+        if self._bits[byte] & (1 << bit):
+            return False
+        self._bits[byte] |= 1 << bit
+        return True
+
+
 class WikiClient(object):
     """
     Various utilities that extend mwclient and could be useful on any wiki/wiki farm
@@ -28,10 +59,40 @@ class WikiClient(object):
     """
     url = None
     client = None
-    write_errors = (AssertUserFailedError, ReadTimeout, APIError, MaximumRetriesExceeded)
+    # the default value of $wgAPIMaxResultSize, the api won't return more than this in one response
+    max_result_size = 8 * 1024 * 1024
+    # how many localized messages to remember, for all languages together
+    localization_cache_size = 10000
+    # how many redirect targets to remember when using target/targets with cache=True
+    target_cache_size = 10000
+    write_errors = (AssertUserFailedError, ReadTimeout, APIError, MaximumRetriesExceeded,
+                    RequestsConnectionError, HTTPError)
 
     def __init__(self, url: str, path='/', credentials: AuthCredentials = None, client: Site = None,
-                 max_retries=3, retry_interval=10, max_retries_mwc: int = 0, cargo: bool=False, **kwargs):
+                 max_retries=3, retry_interval=10, max_retries_mwc: int = 0, cargo: bool=False,
+                 siteinfo_cache: Optional[SiteinfoCache] = None, retry_policy: Optional[RetryPolicy] = None,
+                 maxlag: Optional[int] = None, instrumentation: Optional[Instrumentation] = None,
+                 response_cache: Optional[ResponseCache] = None, **kwargs):
+        """
+        Create a site object.
+
+        :param url: Url of the wiki, optionally including the scheme
+        :param path: Script path of the wiki
+        :param credentials: Optional. Provide if you want a logged-in session.
+        :param client: Optional. If this is provided, SessionManager will not be used.
+        :param cargo: Also create a CargoClient for the wiki
+        :param siteinfo_cache: Optional. If provided, namespaces, extensions, localized messages etc are saved here
+            and reused by later clients for the same wiki, instead of being requested every time a client is created
+        :param retry_policy: Optional. Decides how failed write actions are retried, see RetryPolicy.
+            Defaults to a RetryPolicy with max_retries and retry_interval.
+        :param maxlag: Optional. Send this as maxlag with write actions, so that the wiki asks us to wait while its
+            database replicas are lagged by more than this many seconds. The wait is handled by the retry policy.
+        :param instrumentation: Optional. Report every api call made by this client (including by its CargoClient)
+            and every retry to this, see Instrumentation.
+        :param response_cache: Optional. Save the responses of read-only api calls here and reuse them, e.g. to
+            repeat a dry run without fetching every page again. Cached responses about a page are discarded
+            when it's saved (or changed in any other way) through this client. See ResponseCache.
+        """
         self.scheme = None
         if 'http://' in url:
             self.scheme = 'http'
@@ -53,37 +114,144 @@ class WikiClient(object):
         self.max_retries = max_retries
         self.max_retries_mwc = max_retries_mwc
         self.retry_interval = retry_interval
+        self.retry_policy = retry_policy or RetryPolicy(max_retries=max_retries, retry_interval=retry_interval)
+        self.maxlag = maxlag
+        self.instrumentation = instrumentation
+        self.response_cache = response_cache
 
         self._namespaces = None
         self._ns_name_to_ns = None
 
         self._extensions = None
+        self._relog_lock = threading.Lock()
+
+        self.siteinfo_cache = siteinfo_cache
+        self._siteinfo = siteinfo_cache.load(url, path) if siteinfo_cache is not None else {}
+        self._localization_cache = self._load_localization_cache()
+        self._target_cache = OrderedDict()
 
         if client:
             self.client = client
-            return
-        self.client = session_manager.get_client(url=url, path=path, scheme=self.scheme,
-                                                 max_retries=max_retries_mwc,
-                                                 credentials=credentials, **kwargs)
+        else:
+            self.client = session_manager.get_client(url=url, path=path, scheme=self.scheme,
+                                                     max_retries=max_retries_mwc,
+                                                     credentials=credentials, siteinfo=self._siteinfo.get('site'),
+                                                     **kwargs)
+        self._setup_client()
 
         if cargo is True:
             self.cargo_client = CargoClient(self.client)
-        self._localization_cache = {}
 
     def login(self):
         if self.credentials is None:
             return
         self.client.login(username=self.credentials.username, password=self.credentials.password)
 
-    def relog(self):
+    def relog(self, stale_client: Optional[Site] = None):
         """
         Completely discards pre-existing session and creates a new site object
+        :param stale_client: Optional - the site object whose session failed. If another thread has already
+            replaced it by the time we get the lock, we use the new one instead of logging in again
         :return:
         """
-        # The session manager will log in for us too
-        self.client = session_manager.get_client(url=self.url, path=self.path, scheme=self.scheme,
-                                                 credentials=self.credentials, max_retries=self.max_retries_mwc,
-                                                 **self.kwargs, force_new=True)
+        with self._relog_lock:
+            if stale_client is not None and self.client is not stale_client:
+                return
+            # The session manager will log in for us too
+            self.client = session_manager.get_client(url=self.url, path=self.path, scheme=self.scheme,
+                                                     credentials=self.credentials, max_retries=self.max_retries_mwc,
+                                                     siteinfo=self._siteinfo.get('site'),
+                                                     **self.kwargs, force_new=True)
+            self._setup_client()
+
+    def _setup_client(self):
+        """Applies our settings to a new site object"""
+        if isinstance(self.client, Site):
+            if self.maxlag is not None:
+                self.client.write_maxlag = self.maxlag
+            if self.instrumentation is not None:
+                self.client.instrumentation = self.instrumentation
+            if self.response_cache is not None:
+                self.client.response_cache = self.response_cache
+        self._remember_site()
+
+    def instrument(self, instrumentation: Optional[Instrumentation] = None) -> Instrumentation:
+        """
+        Starts reporting every api call made by this client to an Instrumentation, and returns it
+
+        :param instrumentation: Optional - defaults to the one this client already has, or a new one
+        """
+        self.instrumentation = instrumentation or self.instrumentation or Instrumentation()
+        self._setup_client()
+        return self.instrumentation
+
+    def _remember_site(self):
+        if 'site' in self._siteinfo or not isinstance(self.client, Site):
+            return
+        # if the wiki is private, the site won't be initialized until after we log in
+        siteinfo = self.client.dump_siteinfo()
+        if siteinfo is not None:
+            self._remember_siteinfo('site', siteinfo)
+
+    def _remember_siteinfo(self, key: str, value):
+        self._siteinfo[key] = value
+        self._save_siteinfo()
+
+    def _save_siteinfo(self):
+        if self.siteinfo_cache is not None:
+            self.siteinfo_cache.save(self.url, self.path, self._siteinfo)
+
+    def invalidate_siteinfo_cache(self):
+        """
+        Forgets everything that's been saved about the wiki's configuration, both here and in the siteinfo cache,
+        so that it will be requested again. Use this after adding a namespace, installing an extension, etc.
+        """
+        if self.siteinfo_cache is not None:
+            self.siteinfo_cache.invalidate(self.url, self.path)
+        self._siteinfo = {}
+        self._localization_cache = OrderedDict()
+        self._namespaces = None
+        self._ns_name_to_ns = None
+        self._extensions = None
+        self._remember_site()
+
+    @property
+    def rights(self) -> List[str]:
+        """
+        The rights of the user we're logged in as. mwclient gets them along with the site's information and again
+        whenever it logs in, so this doesn't need its own request
+        """
+        return self.client.rights
+
+    @property
+    def titles_limit(self) -> int:
+        """The number of titles (or other values of a multi-value parameter) that the api accepts in one request"""
+        return 500 if 'apihighlimits' in self.rights else 50
+
+    def paginate(self, items: Iterable, limit: Optional[int] = None) -> Generator[list, None, None]:
+        """
+        Splits titles or Page objects into batches that can each be sent to the api in a single request.
+        Batches are no longer than the titles limit, and when we already know the length of pages (i.e. for Page
+        objects) each batch is also kept small enough that the pages' text fits in one api response.
+
+        :param items: A list or other iterable of titles or Page objects
+        :param limit: Optional - the largest number of items per batch, defaults to the titles limit. Larger
+            values are lowered to the titles limit, since the api would drop the rest of the titles.
+        :return: A generator of lists of items
+        """
+        limit = min(limit or self.titles_limit, self.titles_limit)
+        batch = []
+        size = 0
+        for item in items:
+            length = getattr(item, 'length', None) or 0
+            if len(batch) > 0 and (len(batch) >= limit or size + length > self.max_result_size):
+                yield batch
+                batch = []
+                size = 0
+            batch.append(item)
+            size += length
+        if len(batch) > 0:
+            yield batch
 
     @property
     def namespaces(self):
@@ -101,16 +269,23 @@ class WikiClient(object):
         return self._ns_name_to_ns
 
     def _populate_namespaces(self):
-        result = self.client.api('query', meta='siteinfo', siprop="namespaces|namespacealiases")
+        result = self._siteinfo.get('namespaces')
+        if result is None:
+            response = self.client.api('query', meta='siteinfo', siprop="namespaces|namespacealiases")
+            result = {
+                'namespaces': response['query']['namespaces'],
+                'namespacealiases': response['query']['namespacealiases'],
+            }
+            self._remember_siteinfo('namespaces', result)
         ns_aliases = {}
-        for alias in result['query']['namespacealiases']:
+        for alias in result['namespacealiases']:
             alias_key = str(alias['id'])
             if alias_key not in ns_aliases:
                 ns_aliases[alias_key] = []
             ns_aliases[alias_key].append(alias['*'])
         ns_list = []
         ns_map = {}
-        for ns_str, ns_data in result['query']['namespaces'].items():
+        for ns_str, ns_data in result['namespaces'].items():
             ns = int(ns_str)
             canonical = ns_data.get('canonical')
             aliases = ns_aliases.get(ns_str)
@@ -143,7 +318,8 @@ class WikiClient(object):
         :param filterredir: Passed directly to the MediaWiki api - filter redirects in the result?
         :param limit: Passed directly to the MediaWiki api - limit the number of results?
         :param generator: Default True - return result as a generator? If False, result will be a list
-        :param unique: Default True, but only has an effect if `generator` is False. Remove duplicates from the list output?
+        :param unique: Default True, only has an effect for a list of templates. Remove duplicates from the output?
+            See pages_using_iter for more options.
         :return: A list or generator of Page objects containing all the results of what transcludes the input(s)
         """
         if isinstance(namespace, str):
@@ -151,30 +327,140 @@ class WikiClient(object):
         if isinstance(template, str):
             return self._pages_using_single(template=template, namespace=namespace, filterredir=filterredir,
                                             limit=limit, generator=generator)
+        if not unique:
+            if generator is False:
+                ret = []
+                for tl in template:
+                    ret += self._pages_using_single(template=tl, namespace=namespace, filterredir=filterredir,
+                                                    limit=limit, generator=False)
+                return ret
+            return self._pages_using_gen(template=template, namespace=namespace, filterredir=filterredir,
+                                         limit=limit)
 
+        ret = self.pages_using_iter(template, namespace=namespace, filterredir=filterredir, limit=limit)
         if generator is False:
-            ret = []
-            for tl in template:
-                new_ret = self._pages_using_single(template=tl, namespace=namespace, filterredir=filterredir,
-                                                   limit=limit, generator=generator)
-                ret += new_ret
-            if unique:
-                return list(set(ret))
-            return ret
+            return list(ret)
+        return ret
 
-        return self._pages_using_gen(template=template, namespace=namespace, filterredir=filterredir,
-                                     limit=limit)
+    def pages_using_iter(self, templates: Union[str, List[str]], namespace: Optional[Union[int, str]] = None,
+                         filterredir='all', limit=None, result: str = 'page',
+                         concurrency: int = 1) -> Iterator[Union[Page, str, int]]:
+        """
+        Returns a generator of every page that uses any of the provided templates, each page only once, as the
+        results come in from the api. Pages are kept track of by page id in a bitmap, so this uses very little
+        memory even for hundreds of thousands of results.
 
-    def _pages_using_single(self, template: str, namespace: Optional[int], filterredir, limit, generator):
-        if ':' not in template:
-            title = 'Template:' + template
-        elif template.startswith(':'):
-            title = template[1:]
+        :param templates: A template or list of templates
+        :param namespace: Optional - the namespace to restrict the result set to
+        :param filterredir: Passed directly to the MediaWiki api - filter redirects in the result?
+        :param limit: Passed directly to the MediaWiki api - how many results to get per request, defaults to max
+        :param result: 'page' for Page objects, 'title' for titles, or 'pageid' for page ids.
+            Titles and page ids are cheaper for the api to look up.
+        :param concurrency: Optional - look up this many templates at once. If more than 1, results from the
+            different templates are interleaved as they arrive, rather than one template after another.
+        :return: A generator of Page objects, titles or page ids
+        """
+        if result not in ('page', 'title', 'pageid'):
+            raise ValueError("result must be 'page', 'title' or 'pageid'")
+        if isinstance(templates, str):
+            templates = [templates]
+        if isinstance(namespace, str):
+            namespace = self.get_ns_number(namespace)
+        data = dict(filterredir=filterredir, limit=limit or 'max')
+        if namespace is not None:
+            data['namespace'] = namespace
+        if concurrency > 1 and len(templates) > 1:
+            rows = self._embeddedin_rows_concurrent(templates, result == 'page', data, concurrency)
         else:
-            title = template
+            rows = (row for template in templates
+                    for row in self._embeddedin_rows(template, result == 'page', data))
+        seen = _PageIdSet()
+        for row in rows:
+            if not seen.add(row['pageid']):
+                continue
+            if result == 'page':
+                yield self.client.pages.get(row['title'], info=row)
+            elif result == 'title':
+                yield row['title']
+            else:
+                yield row['pageid']
+
+    def _embeddedin_rows(self, template: str, generator: bool, data: dict) -> Generator[dict, None, None]:
+        prefix = 'gei' if generator else 'ei'
+        params = {prefix + k: v for k, v in data.items()}
+        params[prefix + 'title'] = self._template_page_title(template)
+        if generator:
+            # the same page info that mwclient gets for its generators
+            params.update(generator='embeddedin', prop='info', inprop='protection')
+        else:
+            params['list'] = 'embeddedin'
+        while True:
+            response = self.client.api('query', **params)
+            if generator:
+                yield from response.get('query', {}).get('pages', {}).values()
+            else:
+                yield from response['query']['embeddedin']
+            if 'continue' not in response:
+                return
+            params.update(response['continue'])
+
+    def _embeddedin_rows_concurrent(self, templates: List[str], generator: bool, data: dict,
+                                    concurrency: int) -> Generator[dict, None, None]:
+        # workers hand over each response's rows through a bounded queue, so that they can't get far ahead of us
+        rows_queue = queue.Queue(maxsize=2 * concurrency)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    rows_queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def fetch(template):
+            try:
+                for row in self._embeddedin_rows(template, generator, data):
+                    if stop.is_set():
+                        return
+                    put(row)
+            except Exception as e:
+                put(e)
+                return
+            put(done)
+
+        self._ensure_connection_pool(concurrency)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        for template in templates:
+            executor.submit(fetch, template)
+        try:
+            remaining = len(templates)
+            while remaining > 0:
+                item = rows_queue.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
+
+    def _pages_using_single(self, template: str, namespace: Optional[int], filterredir, limit, generator):
+        title = self._template_page_title(template)
         return self.client.pages[title].embeddedin(namespace=namespace, filterredir=filterredir,
                                                    limit=limit, generator=generator)
 
+    @staticmethod
+    def _template_page_title(template: str) -> str:
+        if ':' not in template:
+            return 'Template:' + template
+        elif template.startswith(':'):
+            return template[1:]
+        return template
+
     def _pages_using_gen(self, template: List[str], namespace: Optional[int], filterredir,
                          limit) -> Generator[Page, None, None]:
         for tl in template:
@@ -183,6 +469,23 @@ class WikiClient(object):
             for p in next_ret:
                 yield p
 
+    def get_redirects_to(self, title: str) -> List[str]:
+        """
+        Returns the titles of all pages that redirect to a page
+
+        :param title: Title of the target page
+        :return: A list of titles of redirects
+        """
+        ret = []
+        data = dict(list='backlinks', bltitle=title, blfilterredir='redirects', bllimit='max')
+        while True:
+            result = self.client.api('query', **data)
+            for row in result['query']['backlinks']:
+                ret.append(row['title'])
+            if 'continue' not in result:
+                return ret
+            data.update(result['continue'])
+
     def recentchanges_by_interval(self, minutes, offset=0,
                                   prop='title|ids|tags|user|patrolled', **kwargs):
         now = datetime.utcnow() - timedelta(minutes=offset)
@@ -202,104 +505,378 @@ class WikiClient(object):
         return titles
 
     def recent_pages_by_interval(self, *args, **kwargs):
-        revisions = self.recent_titles_by_interval(*args, **kwargs)
-        titles = [_['title'] for _ in revisions]
-        for title in titles:
-            yield self.client.pages[title]
+        titles = self.recent_titles_by_interval(*args, **kwargs)
+        # a page can be edited more than once in the interval
+        yield from self.get_pages(dict.fromkeys(titles))
+
+    def change_feed(self, state_file: str, **kwargs) -> ChangeFeed:
+        """
+        Returns a feed of the pages that have changed since the last time a script ran, see ChangeFeed.
+        Unlike recentchanges_by_interval, no change is ever missed or returned twice by consecutive runs.
+
+        :param state_file: Where to save the position in the feed between runs
+        :param kwargs: Passed to ChangeFeed
+        """
+        return ChangeFeed(self, state_file, **kwargs)
 
-    def target(self, name: str) -> Optional[str]:
+    def target(self, name: str, cache: bool = False) -> Optional[str]:
         """
         Return the name of a page's redirect target
 
         :param name: Name of page
+        :param cache: Remember the target, and use a remembered one if there is one. See targets.
         :return: Name of page's redirect target
         """
         if name is None or name == '':
             return None
-        return self.client.pages[name].resolve_redirect().name
-
-    def get_simple_pages(self, title_list: List[str], limit: int) -> List[SimplePage]:
-        titles_paginated = []
-        i = 0
-        paginated_element = []
-        for title in title_list:
-            if i == limit:
-                titles_paginated.append(paginated_element)
-                paginated_element = []
-                i = 0
-            paginated_element.append(title)
-            i += 1
+        return self._resolve_targets([name], cache)[name][0]
+
+    def targets(self, titles: Iterable[str], cache: bool = False,
+                fragments: bool = False) -> Dict[str, Optional[str]]:
+        """
+        Resolves the redirect targets of many pages at once, as many titles per request as the api allows.
+        Titles are normalized by the wiki and double redirects are followed to the end.
+
+        :param titles: Names of pages
+        :param cache: Remember the targets in this process (shared with target), and use any remembered ones
+            instead of asking the wiki again. Only use this if the redirects aren't going to change while it runs.
+        :param fragments: Include the section that a redirect points to, as Title#Section
+        :return: A dict from each title to the name of its final target, which is the normalized title if it's not
+            a redirect, or None if the target doesn't exist
+        """
+        ret = {}
+        for title, (target, fragment, exists) in self._resolve_targets(titles, cache).items():
+            if not exists:
+                ret[title] = None
+            elif fragments and fragment:
+                ret[title] = '{}#{}'.format(target, fragment)
+            else:
+                ret[title] = target
+        return ret
+
+    def _resolve_targets(self, titles: Iterable[str], cache: bool) -> Dict[str, tuple]:
+        """Returns a dict from each title to a tuple of (target, fragment, whether the target exists)"""
+        ret = {}
+        to_fetch = []
+        for title in titles:
+            if title in ret:
+                continue
+            if cache and title in self._target_cache:
+                self._target_cache.move_to_end(title)
+                ret[title] = self._target_cache[title]
+            else:
+                ret[title] = None
+                to_fetch.append(title)
+        for batch in self.paginate(to_fetch):
+            result = self.client.api('query', titles='|'.join(batch), redirects=1)
+            renames = {}
+            for key in ('normalized', 'converted'):
+                for entry in result['query'].get(key, []):
+                    renames[entry['from']] = (entry['to'], None)
+            for entry in result['query'].get('redirects', []):
+                to = entry['to']
+                if 'tointerwiki' in entry:
+                    to = '{}:{}'.format(entry['tointerwiki'], to)
+                renames[entry['from']] = (to, entry.get('tofragment'))
+            missing = {row['title'] for row in result['query'].get('pages', {}).values()
+                       if 'missing' in row or 'invalid' in row}
+            for title in batch:
+                target = title
+                fragment = None
+                seen = set()
+                while target in renames and target not in seen:
+                    seen.add(target)
+                    target, next_fragment = renames[target]
+                    # the fragment of the last redirect in a chain is the one that's used
+                    fragment = next_fragment or fragment
+                ret[title] = (target, fragment, target not in missing)
+                if cache:
+                    self._target_cache[title] = ret[title]
+                    if len(self._target_cache) > self.target_cache_size:
+                        self._target_cache.popitem(last=False)
+        return ret
+
+    def get_simple_pages(self, title_list: Iterable[str], limit: Optional[int] = None,
+                         concurrency: int = 1) -> List[SimplePage]:
+        """
+        Fetches the text of a list of pages, paginating the requests
+
+        :param title_list: A list of page titles
+        :param limit: Optional - the number of titles to query at once. By default, the most the api allows us.
+        :param concurrency: The number of batches to fetch at the same time
+        :return: A list of SimplePage objects, in the same order as title_list
+        """
+        ret = []
+        for batch in self.get_simple_pages_iter(title_list, limit, concurrency=concurrency):
+            ret += batch
+        return ret
+
+    def get_simple_pages_iter(self, title_list: Iterable[str], limit: Optional[int] = None,
+                              concurrency: int = 1) -> Generator[List[SimplePage], None, None]:
+        """
+        Same as get_simple_pages, but yields the pages one batch at a time as each batch is fetched,
+        so the whole list never needs to be held in memory
+
+        :param title_list: A list or other iterable of page titles
+        :param limit: Optional - the number of titles to query at once. By default, the most the api allows us.
+        :param concurrency: The number of batches to fetch at the same time. Batches are still yielded in order.
+        :return: A generator of lists of SimplePage objects, in the same order as title_list
+        """
+        batches = self.paginate(title_list, limit)
+        if concurrency <= 1:
+            for batch in batches:
+                yield self._get_simple_pages_batch(batch)
+            return
+        self._ensure_connection_pool(concurrency)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = deque()
+            while True:
+                # keep up to `concurrency` requests in flight, but never get further ahead than that
+                while len(pending) < concurrency:
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    pending.append(executor.submit(self._get_simple_pages_batch, batch))
+                if len(pending) == 0:
+                    return
+                yield pending.popleft().result()
+
+    def _ensure_connection_pool(self, size: int):
+        """Lets the session keep at least this many connections open to the wiki, so concurrent requests reuse them"""
+        connection = self.client.connection
+        prefix = '{}://'.format(self.client.scheme)
+        adapter = connection.get_adapter(prefix + self.client.host)
+        # leave alone anything that isn't a standard adapter, e.g. one that was mounted for testing
+        if type(adapter) is not HTTPAdapter or adapter._pool_maxsize >= size:
+            return
+        connection.mount(prefix, HTTPAdapter(pool_connections=adapter._pool_connections, pool_maxsize=size,
+                                             max_retries=adapter.max_retries))
+
+    def _get_simple_pages_batch(self, titles: List[str]) -> List[SimplePage]:
+        rows = self._query_titles(titles, prop='revisions', rvprop='content', rvslots='main')
         ret = []
-        titles_paginated.append(paginated_element)
-        for query in titles_paginated:
-            result = self.client.api('query', prop='revisions', titles='|'.join(query), rvprop='content',
-                                     rvslots='main')
-            unsorted_pages = []
-            for pageid in result['query']['pages']:
-                row = result['query']['pages'][pageid]
-                name = row['title']
-                text = row['revisions'][0]['slots']['main']['*'] if row.get('revisions') else ''
-                exists = True if row.get('revisions') else False
-                unsorted_pages.append(SimplePage(name=name, text=text, exists=exists))
-
-            # de-alphabetize & sort according to our initial order
-            capitalization_corrected_query = []
-            for title in query:
-                capitalization_corrected_query.append(title[0].upper() + title[1:])
-                # We don't know if the : is actually separating a namespace or not. So we'll put both in our lookup for
-                # the purpose of re-ordering the response that the api gave us. This is a safe thing to do AS LONG AS
-                # both capitalizations didn't previously exist in the original query given to us by the user
-                # So along the way just double check that wasn't the case.
-
-                # This might be a bit of a hack but it works out pretty nicely; there's only two possible ways the title
-                # could be capitalized, and they end up consecutive in our list (again unless the user specifically
-                # specified both separately), so when we reorder later we're guaranteed to look up and find the entry,
-                # and have it be in the right order.
-                if ':' in title:
-                    p = title.index(':')
-                    ns_ucfirst_title = title[0].upper() + title[1:p + 1] + title[p + 1].upper() + title[p + 2:]
-                    if not any([ns_ucfirst_title in q for q in titles_paginated]):
-                        capitalization_corrected_query.append(ns_ucfirst_title)
-            unsorted_pages.sort(key=lambda x: capitalization_corrected_query.index(x.name))
-            ret += unsorted_pages
+        for title in titles:
+            row = rows.get(title)
+            if row is None or not row.get('revisions'):
+                name = row['title'] if row is not None else title
+                ret.append(SimplePage(name=name, text='', exists=False))
+                continue
+            revision = row['revisions'][0]
+            text = revision['slots']['main']['*'] if 'slots' in revision else revision['*']
+            ret.append(SimplePage(name=row['title'], text=text, exists=True))
+        return ret
+
+    def get_pages(self, titles: Iterable[str]) -> Generator[Page, None, None]:
+        """
+        Turns titles into Page objects, looking up the page info for a whole batch of titles in each request
+        rather than one request per page like client.pages[title] does
+
+        :param titles: A list or other iterable of titles
+        :return: A generator of Page objects, in the same order as titles
+        """
+        for batch in self.paginate(titles):
+            rows = self._query_titles(batch, prop='info', inprop='protection')
+            for title in batch:
+                row = rows.get(title)
+                yield self.client.pages.get(title, info=row) if row is not None else self.client.pages[title]
+
+    def get_pages_with_text(self, pages: List[Union[Page, str]]) -> List[Page]:
+        """
+        Fetches the current text of a batch of pages in a single query and returns them as Page objects, in the
+        same order as the input. Any titles given as strings are turned into Page objects without any extra requests.
+
+        The text is cached on each Page, so calling page.text() afterwards won't make another request, and the
+        timestamp of the fetched revision is kept so that edit conflicts are still detected when saving.
+        Since the text is usually edited and saved, it's always fetched from the wiki, even if there's a response
+        cache.
+
+        :param pages: A list of Page objects or titles. If it's longer than the api's titles limit, or the pages are
+            too large to fit in one response, more than one query will be made.
+        :return: A list of Page objects with their text already loaded
+        """
+        rows = {}
+        with self._bypass_response_cache():
+            for batch in self.paginate(pages):
+                titles = [page if isinstance(page, str) else page.name for page in batch]
+                rows.update(self._query_titles(titles, prop='info|revisions', inprop='protection',
+                                               rvprop='content|timestamp|ids', rvslots='main'))
+        titles = [page if isinstance(page, str) else page.name for page in pages]
+        ret = []
+        for page, title in zip(pages, titles):
+            row = rows.get(title)
+            if isinstance(page, str):
+                page = self.client.pages.get(title, info=row) if row is not None else self.client.pages[title]
+            if row is not None and row.get('revisions'):
+                self._cache_page_text(page, row['revisions'][0])
+            ret.append(page)
+        return ret
+
+    @contextmanager
+    def _bypass_response_cache(self):
+        if not isinstance(self.client, Site):
+            yield
+            return
+        with self.client.bypass_cache():
+            yield
+
+    @staticmethod
+    def _cache_page_text(page: Page, revision: dict):
+        text = revision['slots']['main']['*'] if 'slots' in revision else revision['*']
+        # this is the key mwclient uses for the text of the whole page, without expanding templates
+        page._textcache[hash((None, False))] = text
+        page.last_rev_time = parse_timestamp(revision['timestamp'])
+        page.edit_time = time.gmtime()
+
+    def _query_titles(self, titles: List[str], **kwargs) -> Dict[str, dict]:
+        """
+        Runs a single query for a batch of titles, following any continuation that the api asks for (for example if
+        the texts are too large to fit in one response), and returns the resulting page data keyed by input title
+
+        :param titles: A list of titles, no longer than the api's titles limit
+        :param kwargs: Passed directly to the MediaWiki api
+        :return: A dict from each title as given to us to the api's data for that page
+        """
+        if len(titles) == 0:
+            return {}
+        rows = {}
+        # the api tells us how it changed each title that we gave it, which lets us find each of our titles
+        # in the result without having to guess how the wiki would normalize it
+        renames = {}
+        while True:
+            result = self.client.api('query', titles='|'.join(titles), **kwargs)
+            for key in ('normalized', 'converted', 'redirects'):
+                for entry in result['query'].get(key, []):
+                    renames[entry['from']] = entry['to']
+            for row in result['query'].get('pages', {}).values():
+                if row['title'] not in rows:
+                    rows[row['title']] = row
+                elif 'revisions' in row:
+                    rows[row['title']]['revisions'] = row['revisions']
+            if 'continue' not in result:
+                break
+            kwargs.update(result['continue'])
+        ret = {}
+        for title in titles:
+            row = rows.get(self._follow_renames(title, renames))
+            if row is not None:
+                ret[title] = row
         return ret
 
+    @staticmethod
+    def _follow_renames(title: str, renames: Dict[str, str]) -> str:
+        seen = set()
+        while title in renames and title not in seen:
+            seen.add(title)
+            title = renames[title]
+        return title
+
     def logs_by_interval(self, minutes, offset=0,
                          lelimit="max",
-                         leprop='details|type|title|tags', **kwargs):
+                         leprop='details|type|title|tags|ids|user|comment|timestamp', **kwargs) -> List[dict]:
+        return list(self.logs_by_interval_iter(minutes, offset=offset, lelimit=lelimit, leprop=leprop, **kwargs))
+
+    def logs_by_interval_iter(self, minutes, offset=0,
+                              lelimit="max",
+                              leprop='details|type|title|tags|ids|user|comment|timestamp',
+                              **kwargs) -> Generator[dict, None, None]:
+        """
+        Same as logs_by_interval, but yields log events as each response comes in, following continuation until
+        the end of the interval. To wrap them in LogEntry objects, see models.logs.log_stream.stream_log_entries.
+        """
         now = datetime.utcnow() - timedelta(minutes=offset)
         then = now - timedelta(minutes=minutes)
-        logs = self.client.api('query', format='json',
-                               list='logevents',
-                               #  lestart=now.isoformat(),
-                               leend=then.isoformat(),
-                               leprop=leprop,
-                               lelimit=lelimit,
-                               ledir='older',
-                               **kwargs
-                               )
-        return logs['query']['logevents']
+        data = dict(list='logevents',
+                    #  lestart=now.isoformat(),
+                    leend=then.isoformat(),
+                    leprop=leprop,
+                    lelimit=lelimit,
+                    ledir='older',
+                    **kwargs
+                    )
+        while True:
+            logs = self.client.api('query', format='json', **data)
+            yield from logs['query']['logevents']
+            if 'continue' not in logs:
+                return
+            data.update(logs['continue'])
+
+    def get_token(self, token_type: str = 'csrf', force: bool = False) -> str:
+        """
+        Returns a token for write actions. Tokens are cached for the whole session, i.e. until the next relog,
+        and shared by all of the write methods here.
+
+        :param token_type: Type of token, e.g. csrf or patrol
+        :param force: Fetch a new token even if we already have one
+        """
+        # mwclient keeps the tokens on the site object, which is replaced when we relog
+        return self.client.get_token(token_type, force=force)
+
+    def _api_with_token(self, action: str, token_type: str = 'csrf', **data):
+        """
+        Runs an api action that needs a token, using the cached token. If the wiki says the token is bad
+        (e.g. because it expired), a new one is fetched and the action is tried once more.
+        """
+        try:
+            return self.client.api(action, token=self.get_token(token_type), **data)
+        except APIError as e:
+            if e.code != 'badtoken':
+                raise e
+        return self.client.api(action, token=self.get_token(token_type, force=True), **data)
 
     def patrol(self, revid=None, rcid=None, **kwargs):
         if revid is None and rcid is None:
             raise PatrolRevisionNotSpecified
-        patrol_token = self.client.get_token('patrol')
+        client = self.client
         try:
-            self.client.api('patrol', revid=revid, rcid=rcid, **kwargs, token=patrol_token)
+            self._api_with_token('patrol', 'patrol', revid=revid, rcid=rcid, **kwargs)
         except APIError as e:
             if e.code == 'nosuchrevid' or e.code == 'nosuchrcid':
                 raise PatrolRevisionInvalid
-            self._retry_login_action(self._retry_patrol, 'patrol',
-                                     revid=revid, rcid=rcid, token=patrol_token, **kwargs)
+            self._retry_login_action(self._retry_patrol, 'patrol', client, revid=revid, rcid=rcid, **kwargs)
 
     def _retry_patrol(self, **kwargs):
         # one of these two must be provided but not both
         revid = kwargs.pop('revid') if 'revid' in kwargs else None
         rcid = kwargs.pop('rcid') if 'rcid' in kwargs else None
+        # the token from before the relog is no longer valid, so this will get a new one
+        self._api_with_token('patrol', 'patrol', revid=revid, rcid=rcid, **kwargs)
+
+    def patrol_many(self, rcids: Iterable[int], requests_per_minute: Optional[float] = None,
+                    **kwargs) -> Dict[int, str]:
+        """
+        Patrols many recent changes, using the same patrol token for all of them.
+
+        Each batch of rcids that fails is retried after logging in again, but only the rcids that failed.
+
+        :param rcids: Recent change ids
+        :param requests_per_minute: Optional - the maximum number of changes to patrol per minute
+        :param kwargs: Passed directly to the MediaWiki api, e.g. tags
+        :return: A dict from each rcid to 'patrolled', 'invalid' (if there's no such change) or 'failed'
+        """
+        rate_limiter = RateLimiter(requests_per_minute)
+        ret = {}
+        for batch in self.paginate(rcids):
+            self._run_with_retries(self._patrol_many_once, 'patrol', batch, ret, rate_limiter=rate_limiter, **kwargs)
+        return ret
 
-        # token is mandatory
-        token = kwargs.pop('token')
-        self.client.api('patrol', revid=revid, rcid=rcid, token=token, **kwargs)
+    def _patrol_many_once(self, items: List[int], outcomes: Dict[int, str], rate_limiter: RateLimiter, **kwargs):
+        error = None
+        for rcid in items:
+            if rcid in outcomes:
+                continue
+            rate_limiter.wait()
+            try:
+                self._api_with_token('patrol', 'patrol', rcid=rcid, **kwargs)
+                outcomes[rcid] = 'patrolled'
+            except APIError as e:
+                if e.code == 'nosuchrcid':
+                    outcomes[rcid] = 'invalid'
+                else:
+                    error = e
+            except self.write_errors as e:
+                error = e
+        if error is not None:
+            raise error
 
     def save(self, page: Page, text, summary=u'', minor=False, bot=True, section=None, **kwargs):
         """
@@ -321,8 +898,8 @@ class WikiClient(object):
             page.site = self.client
             page.edit(text, summary=summary, minor=minor, bot=bot, section=section, **kwargs)
         except self.write_errors:
-            self._retry_login_action(self._retry_save, 'edit', page=page, text=text, summary=summary, minor=minor,
-                                     bot=bot, section=section, **kwargs)
+            self._retry_login_action(self._retry_save, 'edit', page.site, page=page, text=text, summary=summary,
+                                     minor=minor, bot=bot, section=section, **kwargs)
 
     def _retry_save(self, **kwargs):
         old_page: Page = kwargs.pop('page')
@@ -339,13 +916,118 @@ class WikiClient(object):
             page.site = self.client
             page.touch()
         except self.write_errors:
-            self._retry_login_action(self._retry_touch, 'touch', page=page)
+            self._retry_login_action(self._retry_touch, 'touch', page.site, page=page)
 
     def _retry_touch(self, **kwargs):
         old_page = kwargs['page']
         page = self.client.pages[old_page.name]
         page.touch()
 
+    def touch_titles(self, titles: Iterable[str], edits_per_minute: Optional[float] = None) -> Dict[str, str]:
+        """
+        Null edits many pages, e.g. to update Cargo tables after a schema change. The api can only edit one page at
+        a time, so this makes one request per title. Pages that don't exist aren't created. If the pages only need
+        their links updated, purge_titles with forcelinkupdate is much faster.
+
+        The titles are grouped only so that when some of them fail, they're retried after logging in again; titles
+        that were already touched aren't edited again.
+
+        :param titles: Names of pages
+        :param edits_per_minute: Optional - the maximum number of null edits to make per minute
+        :return: A dict from each title to 'touched', 'missing' or 'failed'
+        """
+        rate_limiter = RateLimiter(edits_per_minute)
+        ret = {}
+        for batch in self.paginate(titles):
+            self._run_with_retries(self._touch_titles_once, 'touch', batch, ret, rate_limiter=rate_limiter)
+        return ret
+
+    def _touch_titles_once(self, items: List[str], outcomes: Dict[str, str], rate_limiter: RateLimiter):
+        error = None
+        for title in items:
+            if title in outcomes:
+                continue
+            rate_limiter.wait()
+            try:
+                self._api_with_token('edit', title=title, appendtext='', nocreate=1)
+                outcomes[title] = 'touched'
+            except APIError as e:
+                if e.code == 'missingtitle':
+                    outcomes[title] = 'missing'
+                else:
+                    error = e
+            except self.write_errors as e:
+                error = e
+        if error is not None:
+            raise error
+
+    def purge_titles(self, titles: Iterable[str], forcelinkupdate: bool = False,
+                     forcerecursivelinkupdate: bool = False,
+                     requests_per_minute: Optional[float] = None) -> Dict[str, str]:
+        """
+        Purges many pages, as many titles per request as the api allows.
+
+        Each batch of titles that fails is retried after logging in again, but only the titles that failed.
+
+        :param titles: Names of pages
+        :param forcelinkupdate: Also update the links tables (and anything else updated along with them)
+        :param forcerecursivelinkupdate: Also update the links tables of pages that transclude these pages
+        :param requests_per_minute: Optional - the maximum number of purge requests to make per minute
+        :return: A dict from each title to 'purged', 'missing', 'invalid' or 'failed'
+        """
+        rate_limiter = RateLimiter(requests_per_minute)
+        data = {}
+        if forcelinkupdate:
+            data['forcelinkupdate'] = 1
+        if forcerecursivelinkupdate:
+            data['forcerecursivelinkupdate'] = 1
+        ret = {}
+        for batch in self.paginate(titles):
+            self._run_with_retries(self._purge_titles_once, 'purge', batch, ret,
+                                   rate_limiter=rate_limiter, **data)
+        return ret
+
+    def _purge_titles_once(self, items: List[str], outcomes: Dict[str, str], rate_limiter: RateLimiter, **data):
+        titles = [title for title in items if title not in outcomes]
+        rate_limiter.wait()
+        result = self.client.api('purge', titles='|'.join(titles), **data)
+        renames = {}
+        for key in ('normalized', 'converted'):
+            for entry in result.get(key, []):
+                renames[entry['from']] = entry['to']
+        rows = {row['title']: row for row in result.get('purge', [])}
+        failed = []
+        for title in titles:
+            row = rows.get(self._follow_renames(title, renames), {})
+            if 'purged' in row:
+                outcomes[title] = 'purged'
+            elif 'missing' in row:
+                outcomes[title] = 'missing'
+            elif 'invalid' in row:
+                outcomes[title] = 'invalid'
+            else:
+                failed.append(title)
+        if len(failed) > 0:
+            raise APIError('purgefailed', 'Failed to purge: ' + '|'.join(failed), data)
+
+    def _run_with_retries(self, f, failure_type: str, items: list, outcomes: dict, **kwargs):
+        """
+        Runs f on a batch of items (titles, rcids etc), and if it fails, retries it after logging in again until it
+        succeeds or we give up. f must record the outcome of every item that succeeded in outcomes
+        and skip those on later attempts.
+        """
+        client = self.client
+        try:
+            f(items=items, outcomes=outcomes, **kwargs)
+        except self.write_errors:
+            try:
+                self._retry_login_action(f, failure_type, client, items=items, outcomes=outcomes, **kwargs)
+            except RetriedLoginAndStillFailed:
+                pass
+        for item in items:
+            if item not in outcomes:
+                outcomes[item] = 'failed'
+
     def purge_title(self, title: str):
         self.purge(self.client.pages[title])
 
@@ -354,7 +1036,7 @@ class WikiClient(object):
             page.site = self.client
             page.purge()
         except self.write_errors:
-            self._retry_login_action(self._retry_purge, 'purge', page=page)
+            self._retry_login_action(self._retry_purge, 'purge', page.site, page=page)
 
     def _retry_purge(self, **kwargs):
         old_page = kwargs['page']
@@ -372,19 +1054,18 @@ class WikiClient(object):
             'noredirect': 1 if no_redirect else None,
             'ignorewarnings': 1 if ignore_warnings else None,
         }
-        move_token = self.client.get_token('move')
+        client = self.client
         try:
-            self.client.api('move', **data, token=move_token)
+            self._api_with_token('move', 'move', **data)
         except APIError as e:
             if e.code == 'badtoken':
-                self._retry_login_action(self._retry_move, 'move', **data, token=move_token)
+                self._retry_login_action(self._retry_move, 'move', client, **data)
             else:
                 raise e
 
     def _retry_move(self, **kwargs):
-        # token is mandatory
-        token = kwargs.pop('token')
-        self.client.api('move', token=token, **kwargs)
+        # the token from before the relog is no longer valid, so this will get a new one
+        self._api_with_token('move', 'move', **kwargs)
 
     def protect(self, page: Page, protections="edit=sysop|move=sysop", expiry="infinite", reason=None, **data):
         data.update({
@@ -393,18 +1074,17 @@ class WikiClient(object):
             'expiry': expiry,
             'reason': reason,
         })
-        protect_token = self.client.get_token('csrf')
+        client = self.client
         try:
-            self.client.api('protect', **data, token=protect_token)
+            self._api_with_token('protect', 'csrf', **data)
         except APIError as e:
             if e.code == 'badtoken':
-                self._retry_login_action(self._retry_protect, 'move', **data, token=protect_token)
+                self._retry_login_action(self._retry_protect, 'protect', client, **data)
             else:
                 raise e
 
     def _retry_protect(self, **kwargs):
-        token = kwargs.pop('token')
-        self.client.api('protect', token=token, **kwargs)
+        self._api_with_token('protect', 'csrf', **kwargs)
 
     def delete(self, page: Page, reason='', watch=False, unwatch=False, oldimage=False):
         try:
@@ -412,7 +1092,7 @@ class WikiClient(object):
             page.delete(reason=reason, watch=watch, unwatch=unwatch, oldimage=oldimage)
         except APIError as e:
             if e.code == 'badtoken':
-                self._retry_login_action(self._retry_delete, 'delete', page=page, reason=reason,
+                self._retry_login_action(self._retry_delete, 'delete', page.site, page=page, reason=reason,
                                          watch=watch, unwatch=unwatch, oldimage=oldimage)
             else:
                 raise e
@@ -422,24 +1102,35 @@ class WikiClient(object):
         page = self.client.pages[old_page.name]
         page.delete(**kwargs)
 
-    def _retry_login_action(self, f, failure_type, **kwargs):
-        was_successful = False
+    def _retry_login_action(self, f, failure_type, stale_client: Site, **kwargs):
+        """
+        Retries an action that failed, as many times as the retry policy allows. We only log in again if the
+        policy says that the error was caused by our session, and wait as long as it says between tries.
+        This must be called while handling the error that made the action fail.
+
+        :param stale_client: The site object that the action failed with. When several threads are saving, they
+            all fail together when the session expires; only the first one to get here logs in again, and the rest
+            retry with its new session
+        """
+        error = sys.exc_info()[1]
+        client = stale_client
         codes = []
-        for retry in range(self.max_retries):
-            self.relog()
-            # don't sleep at all the first retry, and then increment in retry_interval intervals
-            # default interval is 10, default retries is 3
-            time.sleep((2 ** retry - 1) * self.retry_interval)
+        for retry in range(self.retry_policy.max_retries):
+            if error is None or self.retry_policy.should_relog(error):
+                self.relog(stale_client=client)
+            client = self.client
+            wait = self.retry_policy.wait_time(error, retry)
+            if self.instrumentation is not None:
+                self.instrumentation.record_retry(failure_type, self.retry_policy.classify(error), wait)
+            time.sleep(wait)
             try:
                 f(**kwargs)
-                was_successful = True
-                break
+                return
             except self.write_errors as e:
                 if isinstance(e, APIError):
                     codes.append(e.code)
-                continue
-        if not was_successful:
-            raise RetriedLoginAndStillFailed(failure_type, codes)
+                error = e
+        raise RetriedLoginAndStillFailed(failure_type, codes)
 
     def save_title(self, title: str, text, summary=None, minor=False, bot=True, section=None, **kwargs):
         self.save(self.client.pages[title], text,
@@ -451,8 +1142,8 @@ class WikiClient(object):
             page.site = self.client
             page.append(append_text, summary=summary, minor=minor, bot=bot, section=section, **kwargs)
         except self.write_errors:
-            self._retry_login_action(self._retry_append, 'append', page=page, text=append_text, summary=summary,
-                                     minor=minor, bot=bot, section=section, **kwargs)
+            self._retry_login_action(self._retry_append, 'append', page.site, page=page, text=append_text,
+                                     summary=summary, minor=minor, bot=bot, section=section, **kwargs)
 
     def _retry_append(self, **kwargs):
         old_page: Page = kwargs.pop('page')
@@ -467,8 +1158,8 @@ class WikiClient(object):
             page.site = self.client
             page.prepend(prepend_text, summary=summary, minor=minor, bot=bot, section=section, **kwargs)
         except self.write_errors:
-            self._retry_login_action(self._retry_prepend, 'prepend', page=page, text=prepend_text, summary=summary,
-                                     minor=minor, bot=bot, section=section, **kwargs)
+            self._retry_login_action(self._retry_prepend, 'prepend', page.site, page=page, text=prepend_text,
+                                     summary=summary, minor=minor, bot=bot, section=section, **kwargs)
 
     def _retry_prepend(self, **kwargs):
         old_page: Page = kwargs.pop('page')
@@ -505,14 +1196,15 @@ class WikiClient(object):
         request_errors = ("mustbeloggedin", "permissiondenied", "fileexists-shared-forbidden", "chunk-too-small",
                           "stashfailed", "verification-error", "windows-nonascii-filename", "copyuploaddisabled",
                           "fileexists-no-change")
+        client = self.client
         try:
-            self.client.upload(file=file, filename=filename, description=description, ignore=ignore_warnings,
-                               url=url, filekey=filekey, comment=comment, **kwargs)
+            client.upload(file=file, filename=filename, description=description, ignore=ignore_warnings,
+                          url=url, filekey=filekey, comment=comment, **kwargs)
         except self.write_errors as e:
             # If the returned error code is our fault then don't retry
             if type(e) == APIError and e.code in request_errors:
                 raise e
-            self._retry_login_action(self.client.upload, 'upload', file=file, filename=filename,
+            self._retry_login_action(self.client.upload, 'upload', client, file=file, filename=filename,
                                      description=description, ignore=ignore_warnings, url=url,
                                      filekey=filekey, comment=comment, **kwargs)
 
@@ -528,16 +1220,75 @@ class WikiClient(object):
     def extensions(self):
         if self._extensions is not None:
             return self._extensions
-        result = self.client.get('query', meta='siteinfo', formatversion=2, siprop='extensions')
-        self._extensions = [_['name'] for _ in result['query']['extensions']]
+        if 'extensions' not in self._siteinfo:
+            result = self.client.get('query', meta='siteinfo', formatversion=2, siprop='extensions')
+            self._remember_siteinfo('extensions', [_['name'] for _ in result['query']['extensions']])
+        self._extensions = self._siteinfo['extensions']
         return self._extensions
 
     def localize(self, s: str, uselang: Optional[str] = None) -> Optional[str]:
-        if s in self._localization_cache:
-            return self._localization_cache[s]
+        """
+        Returns the text of a system message in a language, or None if the message doesn't exist.
+        To localize more than a couple of messages at once, use localize_many.
+
+        :param s: Name of the message
+        :param uselang: Language code, defaults to the content language of the wiki
+        """
+        return self.localize_many([s], uselang=uselang)[s]
+
+    def localize_many(self, keys: Iterable[str], uselang: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """
+        Returns the text of several system messages in a language, requesting as many at once as the api allows.
+        Messages that don't exist are returned as None.
+
+        :param keys: Names of the messages
+        :param uselang: Language code, defaults to the content language of the wiki
+        :return: A dict from each message name to its text
+        """
         if uselang is None:
             uselang = self.client.site['lang']
-        res = self.client.get('query', meta='allmessages', ammessages=s, uselang=uselang)
-        if 'missing' in res['query']['allmessages'][0]:
-            return None
-        return res['query']['allmessages'][0]['*']
+        ret = {}
+        to_fetch = []
+        for key in keys:
+            if key in ret:
+                continue
+            if (uselang, key) in self._localization_cache:
+                self._localization_cache.move_to_end((uselang, key))
+                ret[key] = self._localization_cache[(uselang, key)]
+            else:
+                ret[key] = None
+                to_fetch.append(key)
+        if len(to_fetch) == 0:
+            return ret
+        for batch in self.paginate(to_fetch):
+            res = self.client.get('query', meta='allmessages', ammessages='|'.join(batch), uselang=uselang)
+            # the api lowercases the first letter of message names
+            messages = {message['name']: message for message in res['query']['allmessages']}
+            for key in batch:
+                message = messages.get(key) or messages.get(key[:1].lower() + key[1:])
+                # remember missing messages too, as None
+                ret[key] = message['*'] if message is not None and 'missing' not in message else None
+                self._remember_localization(uselang, key, ret[key])
+        self._save_localization_cache()
+        return ret
+
+    def _remember_localization(self, lang: str, key: str, value: Optional[str]):
+        self._localization_cache[(lang, key)] = value
+        self._localization_cache.move_to_end((lang, key))
+        while len(self._localization_cache) > self.localization_cache_size:
+            self._localization_cache.popitem(last=False)
+
+    def _load_localization_cache(self) -> OrderedDict:
+        cache = OrderedDict()
+        for lang, messages in self._siteinfo.get('messages', {}).items():
+            for key, value in messages.items():
+                cache[(lang, key)] = value
+        return cache
+
+    def _save_localization_cache(self):
+        if self.siteinfo_cache is None:
+            return
+        messages = {}
+        for (lang, key), value in self._localization_cache.items():
+            messages.setdefault(lang, {})[key] = value
+        self._remember_siteinfo('messages', messages)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from requests import HTTPError
 
 from mwcleric.clients.cargo_client import CargoClient
@@ -55,6 +57,8 @@ class WikiggClient(WikiClient):
         self.cargo_client = CargoClient(self.client)
         self.credentials = credentials
 
-    def relog(self):
-        super().relog()
-        self.cargo_client = CargoClient(self.client)
+    def relog(self, stale_client: Optional[Site] = None):
+        client = self.client
+        super().relog(stale_client)
+        if self.client is not client:
+            self.cargo_client = CargoClient(self.client)
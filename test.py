@@ -34,6 +34,8 @@ assert 'Leaguepedia:Blocking Policy' in site.pages_using('CommunityNavbox', name
 assert 'Leaguepedia:Blocking Policy' in site.pages_using('CommunityNavbox', namespace='Leaguepedia', generator=False)
 
 assert site.target('Main Page') == 'League of Legends Esports Wiki'
+assert site.targets(['Main Page', 'lowercasepagethatdoesntexist']) == {
+    'Main Page': 'League of Legends Esports Wiki', 'lowercasepagethatdoesntexist': None}
 
 titles = ['Faker', 'Bengi', 'Module:CargoUtil',
           'Main Page', 'Template:Infobox Player', 'Amazing',
@@ -50,6 +52,7 @@ assert pages[6].exists is False
 assert pages[6].name == 'Lowercasepagethatdoesntexist'
 assert pages[9].name == 'Notanamespace:asd'
 assert pages[10].name == 'Notanamespace:Asd'
+assert [p.name for batch in site.get_simple_pages_iter(titles, 3) for p in batch] == [p.name for p in pages]
 
 assert len(cargo_site.cargo_client.query(tables='MwclericTest', fields='Counter')) == 550
 
@@ -0,0 +1,55 @@
+import pytest
+
+from mwcleric.testing.fake_api import FakeWiki
+
+names = ['inf', 'b', 'A', '1e3']
+
+
+@pytest.fixture
+def cargo():
+    wiki = FakeWiki()
+    wiki.add_cargo_rows('Items', ({'_pageName': 'Page {}'.format(i), 'number': (i * 37) % 1201,
+                                   'name': names[i % 4]} for i in range(1200)))
+    return wiki, wiki.client(cargo=True).cargo_client
+
+
+def test_keyset_returns_every_row_once(cargo):
+    wiki, client = cargo
+    rows = client.query(tables='Items', fields='_pageName=Page, number', keyset=True)
+    assert [row['Page'] for row in rows] == ['Page {}'.format(i) for i in range(1200)]
+    assert wiki.requests['cargoquery'] == 3
+
+
+def test_keyset_with_where(cargo):
+    wiki, client = cargo
+    rows = client.query(tables='Items', fields='_pageName=Page', where='name = "b"', keyset=True)
+    assert [row['Page'] for row in rows] == ['Page {}'.format(i) for i in range(1, 1200, 4)]
+
+
+def test_sharded_matches_unsharded(cargo):
+    wiki, client = cargo
+    expected = client.query(tables='Items', fields='_pageName=Page, number')
+    rows = client.query_sharded(tables='Items', fields='_pageName=Page, number', shards=5)
+    assert sorted(row['Page'] for row in rows) == sorted(row['Page'] for row in expected)
+
+
+@pytest.mark.parametrize('order_by', ['number', 'number DESC'])
+def test_sharded_rows_are_merged_in_order(cargo, order_by):
+    wiki, client = cargo
+    rows = client.query_sharded(tables='Items', fields='_pageName=Page, number', order_by=order_by, shards=4)
+    numbers = [int(row['number']) for row in rows]
+    assert len(rows) == 1200
+    assert numbers == sorted(numbers, reverse=order_by.endswith('DESC'))
+
+
+def test_sharded_strings_are_compared_as_text(cargo):
+    wiki, client = cargo
+    rows = client.query_sharded(tables='Items', fields='_pageName=Page, name', order_by='name',
+                                partition_field='name', partition_values=names)
+    assert list(dict.fromkeys(row['name'] for row in rows)) == ['1e3', 'A', 'b', 'inf']
+
+
+def test_sharded_order_by_must_be_a_field(cargo):
+    wiki, client = cargo
+    with pytest.raises(ValueError):
+        client.query_sharded(tables='Items', fields='_pageName=Page', order_by='number', shards=2)
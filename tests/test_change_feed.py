@@ -0,0 +1,49 @@
+import os
+from datetime import datetime
+
+from mwcleric.testing.fake_api import FakeWiki
+
+
+def make_feed(tmp_path):
+    wiki = FakeWiki()
+    site = wiki.client(credentials=wiki.credentials())
+    feed = site.change_feed(os.path.join(str(tmp_path), 'state.json'), since=datetime(2023, 1, 1))
+    return wiki, site, feed
+
+
+def test_cursor_advances_only_on_commit(tmp_path):
+    wiki, site, feed = make_feed(tmp_path)
+    wiki.set_page('A', 'a')
+    wiki.set_page('B', 'b')
+    assert feed.poll() == [['A', 'B']]
+    # not committed, so the same changes are returned again
+    assert feed.poll() == [['A', 'B']]
+    feed.commit()
+    assert feed.poll() == []
+    wiki.set_page('C', 'c')
+    wiki.add_log('delete', 'D')
+    assert feed.poll() == [['C', 'D']]
+
+
+def test_state_is_kept_between_runs(tmp_path):
+    wiki, site, feed = make_feed(tmp_path)
+    wiki.set_page('A', 'a')
+    feed.poll()
+    feed.commit()
+    wiki.set_page('B', 'b')
+    feed = site.change_feed(feed.state_file, since=datetime(2023, 1, 1))
+    assert feed.poll() == [['B']]
+
+
+def test_later_change_with_lower_id_is_not_skipped(tmp_path):
+    wiki, site, feed = make_feed(tmp_path)
+    wiki.set_page('A', 'a')
+    wiki.set_page('B', 'b')
+    feed.poll()
+    feed.commit()
+    wiki.recent_changes.append({'type': 'edit', 'ns': 0, 'title': 'C', 'pageid': 9, 'revid': 9, 'rcid': 1,
+                                'timestamp': '2024-06-01T00:00:00Z', 'comment': '', 'user': '127.0.0.1'})
+    assert feed.poll() == [['C']]
+    feed.commit()
+    assert feed.state['rc'] == {'timestamp': '2024-06-01T00:00:00Z', 'id': 1}
+    assert feed.poll() == []
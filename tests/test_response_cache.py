@@ -0,0 +1,35 @@
+import os
+
+from mwcleric.clients.response_cache import ResponseCache
+from mwcleric.testing.fake_api import FakeWiki
+
+
+def make_site(tmp_path):
+    wiki = FakeWiki()
+    wiki.set_page('Cached', 'old')
+    cache = ResponseCache(os.path.join(str(tmp_path), 'responses.sqlite3'))
+    return wiki, wiki.client(credentials=wiki.credentials(), response_cache=cache), cache
+
+
+def test_reads_are_cached(tmp_path):
+    wiki, site, cache = make_site(tmp_path)
+    assert site.get_simple_pages(['Cached'])[0].text == 'old'
+    wiki.reset_counts()
+    assert site.get_simple_pages(['Cached'])[0].text == 'old'
+    assert wiki.requests['query'] == 0
+    assert cache.hits == 1
+
+
+def test_edit_invalidates_cached_responses(tmp_path):
+    wiki, site, cache = make_site(tmp_path)
+    site.get_simple_pages(['Cached'])
+    site.save_title('Cached', 'new')
+    assert site.get_simple_pages(['Cached'])[0].text == 'new'
+
+
+def test_text_to_be_saved_is_never_cached(tmp_path):
+    wiki, site, cache = make_site(tmp_path)
+    site.get_pages_with_text(['Cached'])
+    # edited by someone else, so we don't know about it
+    wiki.set_page('Cached', 'edited elsewhere')
+    assert site.get_pages_with_text(['Cached'])[0].text() == 'edited elsewhere'
@@ -0,0 +1,40 @@
+import threading
+
+from mwcleric.testing.fake_api import FakeWiki
+
+
+def test_concurrent_saves_log_in_again_once():
+    wiki = FakeWiki(latency=0.02)
+    site = wiki.client(credentials=wiki.credentials(), retry_interval=0)
+    pages = [site.client.pages['Page {}'.format(i)] for i in range(8)]
+    # the session expires while every worker is saving
+    wiki.user = None
+    wiki.reset_counts()
+    threads = [threading.Thread(target=site.save, args=(page, 'text')) for page in pages]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert wiki.requests['login'] == 1
+    assert all(wiki.text(page.name) == 'text' for page in pages)
+
+
+def test_relog_skipped_if_client_already_replaced():
+    wiki = FakeWiki()
+    site = wiki.client(credentials=wiki.credentials())
+    stale = site.client
+    site.relog(stale_client=stale)
+    replaced = site.client
+    wiki.reset_counts()
+    site.relog(stale_client=stale)
+    assert site.client is replaced
+    assert wiki.requests['login'] == 0
+
+
+def test_paginate_never_exceeds_titles_limit():
+    wiki = FakeWiki()
+    titles = wiki.add_pages(120, size=10)
+    site = wiki.client()
+    assert site.titles_limit == 50
+    assert [len(batch) for batch in site.paginate(titles, limit=500)] == [50, 50, 20]
+    assert all(page.exists for page in site.get_simple_pages(titles, limit=500))